@@ -4,20 +4,34 @@ import sys
 from flask_migrate import upgrade
 from flask_apscheduler import APScheduler
 from contest import create_app
+from contest.lease import run_exclusive
 from contest.tasks import strava_sync, compute
 from contest.init_defaults import initialize_defaults
 
 
 def should_start_scheduler():
+    # SCHEDULER_ENABLED: start it in every worker process (e.g. gunicorn), the lease
+    # taken by sync_and_compute keeps the runs exclusive
     return (
         os.environ.get("WERKZEUG_RUN_MAIN") == "true"
         or os.environ.get("FLASK_MAIN_PROCESS") == "true"
+        or os.environ.get("SCHEDULER_ENABLED") == "true"
     )
 
-def sync_and_compute(flask_app):
-    strava_sync(flask_app)
+def _sync_and_compute(flask_app, stop):
+    strava_sync(flask_app, stop=stop)
+    if stop.is_set():
+        # The lease was lost: the process holding it now runs the computation
+        return
     compute(flask_app)
 
+def sync_and_compute(flask_app):
+    # Only one process at a time, once per interval: a tick while another run is still
+    # going, or shortly after it started, is skipped. A tenth of the interval is left for
+    # the jitter of the schedulers, so that the same process runs on every tick.
+    interval = datetime.timedelta(minutes=int(flask_app.config["STRAVA_SYNC_INTERVAL"]))
+    run_exclusive(flask_app, "strava_sync_and_compute", _sync_and_compute, flask_app, interval=interval * 0.9)
+
 def ensure_db_up_to_date(flask_app):
     with flask_app.app_context():
         upgrade()
@@ -36,9 +50,11 @@ if should_start_scheduler():
             id="strava_sync_and_compute",
             func=sync_and_compute,
             trigger='interval',
-            minutes=15,
+            minutes=int(app.config["STRAVA_SYNC_INTERVAL"]),
             args=[app],
             replace_existing=True,
+            max_instances=1,
+            coalesce=True,
             next_run_time=datetime.datetime.now() + datetime.timedelta(seconds=10)
         )
         scheduler.start()
@@ -0,0 +1,170 @@
+"""
+Synthetic clubs: athletes with years of activities following a realistic weekly cadence.
+
+    club = generate_club(athletes=500, years=2, seed=1)
+    store_club(club)  # within an app context
+
+Each athlete gets a profile (habitual sessions per week, favourite sports, usual session
+length). Week after week, the number of sessions follows a Poisson law around that habit,
+modulated by the season (fewer in winter), and interrupted by breaks of a few weeks
+(injury, holidays). Sessions favour the weekend, and a few are too short to count.
+The same seed always gives the same club.
+"""
+import math
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import insert
+from contest.extensions import db
+from contest.models import Activity, Athlete
+
+# (sport, share of the athletes favouring it, average speed in m/s)
+SPORTS = (("Run", 0.45, 2.9), ("Ride", 0.3, 7.5), ("Walk", 0.15, 1.4), ("Swim", 0.1, 0.9))
+# Sessions per week of the athlete profiles, with their share of the club
+PROFILES = ((0.7, 0.35), (2.0, 0.4), (4.0, 0.2), (6.5, 0.05))
+# Relative chance of a session on each weekday (Monday first)
+WEEKDAY_WEIGHTS = (1.0, 1.1, 1.2, 1.0, 0.8, 1.6, 1.8)
+# Chance, every week, that a break of 1 to BREAK_MAX_WEEKS weeks starts
+BREAK_RATE = 0.03
+BREAK_MAX_WEEKS = 6
+# Activity ids: athlete id * ACTIVITY_ID_STRIDE + rank of the activity
+ACTIVITY_ID_STRIDE = 100_000
+# Activities inserted per statement by store_club
+STORE_BATCH_SIZE = 5000
+
+SPEEDS = {sport: speed for sport, _, speed in SPORTS}
+
+
+def _poisson(rng, mean):
+    """Poisson draw (Knuth's method: the means involved are small)."""
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _season_factor(day):
+    """Training volume through the year: lowest in January, highest in July."""
+    return 1 + 0.3 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 105) / 365)
+
+
+@dataclass
+class SyntheticAthlete:  # pylint: disable=too-many-instance-attributes
+    """Profile of a synthetic athlete; the activities are generated on demand (always the same)."""
+    id: int
+    firstname: str
+    lastname: str
+    sessions_per_week: float
+    favourites: tuple
+    usual_minutes: float
+    first_monday: date
+    end: date
+    seed: int
+
+    def activities(self):
+        """Activities (dicts of Activity columns), newest first like the Strava API."""
+        rng = random.Random(self.seed)
+        activities = []
+        on_break = 0
+        monday = self.first_monday
+        while monday <= self.end:
+            if on_break:
+                on_break -= 1
+            elif rng.random() < BREAK_RATE:
+                on_break = rng.randint(1, BREAK_MAX_WEEKS)
+            else:
+                sessions = min(_poisson(rng, self.sessions_per_week * _season_factor(monday)), 7)
+                weekdays = set()
+                while len(weekdays) < sessions:
+                    weekdays.add(rng.choices(range(7), WEEKDAY_WEIGHTS)[0])
+                for weekday in sorted(weekdays):
+                    day = monday + timedelta(days=weekday)
+                    if day <= self.end:
+                        activities.append(self._activity(rng, len(activities), day))
+            monday += timedelta(weeks=1)
+        activities.reverse()
+        return activities
+
+    def _activity(self, rng, rank, day):
+        sport = self.favourites[0] if rng.random() < 0.75 else self.favourites[1]
+        moving_time = int(min(max(rng.lognormvariate(math.log(self.usual_minutes * 60), 0.4), 300), 6 * 3600))
+        start_date = datetime.combine(day, datetime.min.time()) + timedelta(
+            hours=rng.choice((6, 7, 12, 17, 18, 19)), minutes=rng.randrange(60)
+        )
+        return {
+            "id": self.id * ACTIVITY_ID_STRIDE + rank,
+            "athlete_id": self.id,
+            "name": f"{sport} {start_date:%d/%m}",
+            "distance": round(moving_time * SPEEDS[sport] * rng.uniform(0.8, 1.2), 1),
+            "moving_time": moving_time,
+            "elapsed_time": int(moving_time * rng.uniform(1.0, 1.3)),
+            "start_date": start_date,
+            "total_elevation_gain": rng.randrange(0, 400) if sport in ("Run", "Ride") else 0,
+            "type": sport,
+            "photo_count": rng.choice((0, 0, 0, 1, 2)),
+            "polyline": None if sport == "Swim" else "_p~iF~ps|U_ulLnnqC_mqNvxq`@",
+        }
+
+
+def generate_club(athletes=100, years=1, seed=0, end=None):
+    """Return {athletes} SyntheticAthlete, active over the {years} years before {end} (default: today)."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    first_monday = end - timedelta(days=end.weekday()) - timedelta(weeks=round(years * 52))
+    sports = [sport for sport, _, _ in SPORTS]
+    return [
+        SyntheticAthlete(
+            id=athlete_id, firstname=f"Athlete{athlete_id}", lastname=f"Synthetic{athlete_id % 97}",
+            sessions_per_week=rng.choices([rate for rate, _ in PROFILES], [share for _, share in PROFILES])[0]
+            * rng.uniform(0.7, 1.3),
+            favourites=tuple(rng.choices(sports, [share for _, share, _ in SPORTS], k=2)),
+            usual_minutes=rng.uniform(30, 75),
+            first_monday=first_monday, end=end, seed=rng.getrandbits(32),
+        )
+        for athlete_id in range(1, athletes + 1)
+    ]
+
+
+def activity_values(activity_id, start_date, **values):
+    """Columns of a plain 30-minute run (dict as in SyntheticAthlete.activities), overridden by {values}."""
+    return {
+        "id": activity_id, "athlete_id": None, "name": f"Activity {activity_id}", "distance": 5000.0,
+        "moving_time": 1800, "elapsed_time": 1900, "start_date": start_date, "total_elevation_gain": 10.0,
+        "type": "Run", "photo_count": 0, "polyline": None, **values,
+    }
+
+
+def strava_activity(values):
+    """Activity as returned by stravalib, for a mocked client (see tasks.activity_values)."""
+    return SimpleNamespace(
+        **{key: value for key, value in values.items() if key not in ("athlete_id", "type", "polyline")},
+        type=SimpleNamespace(root=values["type"]),
+        map=SimpleNamespace(polyline=values["polyline"]) if values["polyline"] else None,
+    )
+
+
+def store_club(club, athletes=None, expires_at=None):
+    """
+    Insert the athletes of {club} (with Strava tokens, expiring at the {expires_at}
+    timestamp), and the activities of those in {athletes} (ids; default: all), in batches.
+    Points are left to compute.
+    """
+    db.session.execute(insert(Athlete), [
+        {"id": athlete.id, "firstname": athlete.firstname, "lastname": athlete.lastname,
+         "access_token": f"token{athlete.id}", "refresh_token": f"refresh{athlete.id}", "expires_at": expires_at}
+        for athlete in club
+    ])
+    batch = []
+    for athlete in club:
+        if athletes is not None and athlete.id not in athletes:
+            continue
+        for values in athlete.activities():
+            batch.append({**values, "has_map": 1 if values["polyline"] else 0})
+            if len(batch) >= STORE_BATCH_SIZE:
+                db.session.execute(insert(Activity), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(Activity), batch)
+    db.session.commit()
@@ -0,0 +1,315 @@
+"""
+Local fake of the Strava API endpoints used by the application, for tests and benchmarks.
+
+    with FakeStrava(club=generate_club(20), latency=0.01, rate_limit=(100, 1000)) as strava:
+        app.config["STRAVA_API_ORIGIN"] = strava.origin
+
+Endpoints: athlete, activities list (paginated, after/before), activity detail and token
+refresh (POST /oauth/token). With {club} (see dataset.py), every synthetic athlete is
+served with their activities, authenticated by the tokens written by dataset.store_club
+("token<id>", "refresh<id>"), which expire {token_ttl} seconds after the start (None:
+never) like the tokens issued by a refresh. Otherwise, any token is athlete {athlete_id},
+with {activities} generated activities.
+
+Injected faults: every new connection costs {handshake_delay} seconds (stand-in for the
+TCP + TLS handshakes of the real API), every request {latency} seconds; a share
+{error_rate} of the API requests fail with a 500, and with {rate_limit} (15-minute limit,
+daily limit) requests beyond the limits get a 429, the usage being reported in the
+X-RateLimit-* headers. The 15-minute window lasts {rate_window} seconds.
+
+The server speaks HTTP/1.1 so connections are kept alive. {stats} counts connections and
+requests, {events} the injected errors, 429 responses and token refreshes.
+
+Standalone (e.g. as STRAVA_API_ORIGIN for a sync benchmark against a database filled
+with dataset.store_club, same athletes and seed):
+
+    python -m benchmarks.fake_strava --athletes 100 --years 2 --port 8081 --latency 0.05 --rate-limit 100,1000
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from .dataset import activity_values, generate_club
+
+ACTIVITY_PATH = re.compile(r"^/api/v3/activities/(\d+)$")
+
+
+def fake_athlete(athlete_id, firstname=None, lastname="Fake"):
+    return {
+        "id": athlete_id, "firstname": firstname or f"Athlete{athlete_id}", "lastname": lastname,
+        "country": "Testland",
+    }
+
+
+def fake_activity(activity_id, start_date):
+    return synthetic_activity(activity_values(activity_id, start_date, polyline="abc"))
+
+
+def synthetic_activity(values):
+    """Strava representation of an activity (see dataset.activity_values and SyntheticAthlete.activities)."""
+    activity = {
+        key: values[key] for key in ("id", "name", "distance", "moving_time", "elapsed_time", "total_elevation_gain",
+                                     "type", "photo_count")
+    }
+    activity["sport_type"] = values["type"]
+    activity["start_date"] = values["start_date"].strftime("%Y-%m-%dT%H:%M:%SZ")
+    if values["athlete_id"] is not None:
+        activity["athlete"] = {"id": values["athlete_id"], "resource_state": 1}
+    activity["map"] = {"id": f"a{values['id']}", "summary_polyline": values["polyline"], "polyline": values["polyline"]}
+    return activity
+
+
+def _timestamp(start_date):
+    return datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%SZ").timestamp()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def setup(self):
+        # Once per connection
+        super().setup()
+        self.server.fake.count("connections")
+        time.sleep(self.server.fake.handshake_delay)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _query(self, url):
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if self.command == "POST" and int(self.headers.get("Content-Length") or 0):
+            body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+            query.update({key: values[0] for key, values in parse_qs(body).items()})
+        return query
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.do_GET()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        fake = self.server.fake
+        fake.count("requests")
+        time.sleep(fake.latency)
+        url = urlsplit(self.path)
+        query = self._query(url)
+        status, payload = fake.limit()
+        if status is None and url.path == "/oauth/token" and self.command == "POST":
+            status, payload = fake.refresh(query.get("refresh_token"))
+        elif status is None:
+            status, payload = fake.fail() or fake.api(url.path, query, self._token(query))
+        self._send(status, payload)
+
+    def _token(self, query):
+        authorization = self.headers.get("Authorization", "")
+        return query.get("access_token") or authorization.removeprefix("Bearer ") or None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in self.server.fake.rate_headers().items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeStrava"
+
+
+class FakeStrava:  # pylint: disable=too-many-instance-attributes
+    """Fake Strava API server running in a background thread (see module docstring)."""
+    def __init__(  # pylint: disable=too-many-arguments
+        self, activities=0, athlete_id=1, handshake_delay=0.0, latency=0.0, *, club=None, error_rate=0.0,
+        token_ttl=None, rate_limit=None, rate_window=900, seed=0, host="127.0.0.1", port=0,
+    ):
+        self.athlete_id = athlete_id
+        self.handshake_delay = handshake_delay
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.address = (host, port)
+        self.club = {athlete.id: athlete for athlete in club} if club is not None else None
+        start = datetime(2025, 1, 1, 8)
+        self.activities = [
+            fake_activity(i, start + timedelta(hours=12 * i)) for i in range(activities, 0, -1)
+        ]
+        self.stats = {"connections": 0, "requests": 0}
+        self.events = {"errors": 0, "rate_limited": 0, "token_refreshes": 0}
+        expires_at = time.time() + token_ttl if token_ttl else None
+        # access token: (athlete id, expiry timestamp or None); refresh token: athlete id
+        self.tokens = {f"token{athlete_id}": (athlete_id, expires_at) for athlete_id in self.club or ()}
+        self.refresh_tokens = {f"refresh{athlete_id}": athlete_id for athlete_id in self.club or ()}
+        self._activities = {}
+        self._usage = {"short": (None, 0), "long": (None, 0)}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _event(self, event):
+        with self._lock:
+            self.events[event] += 1
+
+    @property
+    def origin(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Fault injection
+
+    def limit(self):
+        """Count the request against the rate limits: (429, error) beyond them, else (None, None)."""
+        if self.rate_limit is None:
+            return None, None
+        now = time.time()
+        windows = {"short": int(now // self.rate_window), "long": int(now // 86400)}
+        with self._lock:
+            for name, window in windows.items():
+                current, usage = self._usage[name]
+                self._usage[name] = (window, (usage if current == window else 0) + 1)
+            exceeded = any(self._usage[name][1] > limit for name, limit in zip(("short", "long"), self.rate_limit))
+        if not exceeded:
+            return None, None
+        self._event("rate_limited")
+        return 429, {"message": "Rate Limit Exceeded",
+                     "errors": [{"resource": "Application", "field": "rate limit", "code": "exceeded"}]}
+
+    def rate_headers(self):
+        if self.rate_limit is None:
+            return {}
+        with self._lock:
+            usage = [self._usage[name][1] for name in ("short", "long")]
+        return {
+            "X-RateLimit-Limit": ",".join(map(str, self.rate_limit)),
+            "X-RateLimit-Usage": ",".join(map(str, usage)),
+        }
+
+    def fail(self):
+        """(500, error) for a share {error_rate} of the requests, else None."""
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if not failed:
+            return None
+        self._event("errors")
+        return 500, {"message": "Internal Server Error", "errors": []}
+
+    # Endpoints
+
+    def refresh(self, refresh_token):
+        """Token refresh: a new access token for the athlete of {refresh_token}."""
+        if self.club is None:
+            athlete_id = self.athlete_id
+        elif refresh_token in self.refresh_tokens:
+            athlete_id = self.refresh_tokens[refresh_token]
+        else:
+            return 400, {"message": "Bad Request",
+                         "errors": [{"resource": "RefreshToken", "field": "refresh_token", "code": "invalid"}]}
+        self._event("token_refreshes")
+        ttl = self.token_ttl or 6 * 3600
+        expires_at = int(time.time() + ttl)
+        with self._lock:
+            access_token = f"token{athlete_id}.{self.events['token_refreshes']}"
+            self.tokens[access_token] = (athlete_id, expires_at)
+        return 200, {"token_type": "Bearer", "access_token": access_token, "refresh_token": refresh_token,
+                     "expires_at": expires_at, "expires_in": ttl}
+
+    def _authenticate(self, token):
+        """Return the athlete id of {token}, or None if unknown or expired."""
+        if self.club is None:
+            return self.athlete_id
+        athlete_id, expires_at = self.tokens.get(token, (None, None))
+        if expires_at is not None and time.time() >= expires_at:
+            return None
+        return athlete_id
+
+    def athlete_activities(self, athlete_id):
+        """Strava representation of the activities of an athlete, newest first."""
+        if self.club is None:
+            return self.activities
+        with self._lock:
+            if athlete_id not in self._activities:
+                self._activities[athlete_id] = [
+                    synthetic_activity(values) for values in self.club[athlete_id].activities()
+                ]
+            return self._activities[athlete_id]
+
+    def api(self, path, query, token):
+        athlete_id = self._authenticate(token)
+        if athlete_id is None:
+            return 401, {"message": "Authorization Error",
+                         "errors": [{"resource": "Athlete", "field": "access_token", "code": "invalid"}]}
+        if path == "/api/v3/athlete":
+            athlete = self.club[athlete_id] if self.club else None
+            return 200, fake_athlete(athlete_id, *((athlete.firstname, athlete.lastname) if athlete else ()))
+        if path == "/api/v3/athlete/activities":
+            activities = self.athlete_activities(athlete_id)
+            if "after" in query:
+                activities = [a for a in activities if _timestamp(a["start_date"]) > float(query["after"])]
+            if "before" in query:
+                activities = [a for a in activities if _timestamp(a["start_date"]) < float(query["before"])]
+            page, per_page = int(query.get("page", 1)), int(query.get("per_page", 30))
+            return 200, activities[(page - 1) * per_page:page * per_page]
+        if match := ACTIVITY_PATH.match(path):
+            activity_id = int(match.group(1))
+            for activity in self.athlete_activities(athlete_id):
+                if activity["id"] == activity_id:
+                    return 200, activity
+        return 404, {"message": "Record Not Found", "errors": []}
+
+    def __enter__(self):
+        self._server = _Server(self.address, _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-strava", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--athletes", type=int, default=100)
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with a 500")
+    parser.add_argument("--token-ttl", type=float, help="seconds before the access tokens expire")
+    parser.add_argument("--rate-limit", help="15-minute and daily limits, e.g. 100,1000")
+    args = parser.parse_args()
+
+    rate_limit = tuple(int(limit) for limit in args.rate_limit.split(",")) if args.rate_limit else None
+    fake = FakeStrava(
+        club=generate_club(args.athletes, args.years, args.seed), latency=args.latency, error_rate=args.error_rate,
+        token_ttl=args.token_ttl, rate_limit=rate_limit, seed=args.seed, host=args.host, port=args.port,
+    )
+    with fake:
+        print(f"Fake Strava API on {fake.origin} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+    print(json.dumps({**fake.stats, **fake.events}))
+
+
+if __name__ == "__main__":
+    main()
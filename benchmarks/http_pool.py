@@ -0,0 +1,71 @@
+"""
+Connection reuse benchmark: synchronize {athletes} athletes (athlete details + every page
+of activities) against the local fake Strava server, with one HTTP session per athlete
+(a new stravalib Client each, as before) and with the shared pooled session.
+
+    python -m benchmarks.http_pool --athletes 20 --activities 600 --handshake-delay 0.02
+
+Prints, per mode, the number of requests and connections, and the per-request latency.
+"""
+import argparse
+import json
+import logging
+import statistics
+from stravalib import Client
+from contest.strava_http import build_strava_session
+from .fake_strava import FakeStrava
+
+TIMEOUT = (5, 30)
+
+
+def _latency_summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+def run(strava, athletes, shared):
+    """Synchronize {athletes} athletes; return the request and connection counts, and latencies."""
+    strava.stats = {"connections": 0, "requests": 0}
+    latencies = []
+
+    def record(response, *_, **__):
+        latencies.append(response.elapsed.total_seconds())
+
+    pooled = build_strava_session(10, TIMEOUT, origin=strava.origin) if shared else None
+    for athlete in range(athletes):
+        session = pooled or build_strava_session(10, TIMEOUT, origin=strava.origin)
+        session.hooks["response"] = [record]
+        client = Client(
+            access_token=f"token{athlete}", requests_session=session, rate_limiter=lambda *_: None
+        )
+        client.get_athlete()
+        list(client.get_activities())
+        if not shared:
+            session.close()
+    return {**strava.stats, **_latency_summary(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--athletes", type=int, default=20)
+    parser.add_argument("--activities", type=int, default=600, help="activities per athlete")
+    parser.add_argument("--handshake-delay", type=float, default=0.02, help="seconds per new connection")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per request")
+    args = parser.parse_args()
+    # stravalib complains about the missing client credentials for every client
+    logging.disable(logging.ERROR)
+
+    with FakeStrava(activities=args.activities, handshake_delay=args.handshake_delay, latency=args.latency) as strava:
+        results = {
+            "per_athlete_session": run(strava, args.athletes, shared=False),
+            "shared_session": run(strava, args.athletes, shared=True),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
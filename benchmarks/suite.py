@@ -0,0 +1,184 @@
+"""
+Benchmark suite on a synthetic club (see dataset.py): Strava sync with a mocked client,
+points computation, per-athlete scoring and leaderboard reads, on a SQLite file.
+
+    python -m benchmarks.suite --athletes 1000 --years 2 --output results.json
+
+Writes JSON: the parameters and size of the dataset, the environment, and per benchmark
+the number of runs and their durations in milliseconds. Run it again with the same
+parameters (same seed: same club) to compare two versions.
+"""
+import argparse
+import json
+import logging
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from config import Config
+from contest import create_app
+from contest.api import get_month_data, get_week_data, get_year_data
+from contest.extensions import db
+from contest.leaderboard import week_month
+from contest.models import Activity, Athlete
+from contest.rules import ContestEngine, RegularityBonusA, RegularityBonusB, Standard
+from contest.tasks import compute, mark_weeks_dirty, sync_athlete, utcnow
+from .dataset import generate_club, store_club, strava_activity
+from .fake_strava import FakeStrava
+
+
+def summary(durations):
+    """Runs and durations (ms) of a benchmark."""
+    durations = sorted(durations)
+    return {
+        "runs": len(durations),
+        "total_ms": round(sum(durations) * 1000, 3),
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "p50_ms": round(durations[len(durations) // 2] * 1000, 3),
+        "p95_ms": round(durations[int(len(durations) * 0.95)] * 1000, 3),
+        "max_ms": round(durations[-1] * 1000, 3),
+    }
+
+
+def measure(func, calls):
+    """Call {func} with each of the argument tuples of {calls}; return the summary of the durations."""
+    durations = []
+    for args in calls:
+        started = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - started)
+    return summary(durations)
+
+
+def mocked_strava(club):
+    """Replacement of stravalib.Client serving the synthetic athletes, by access token."""
+    athletes = {f"token{athlete.id}": athlete for athlete in club}
+
+    def make_client(access_token=None, **_):
+        athlete = athletes[access_token]
+        client = MagicMock()
+        client.access_token = access_token
+        client.get_athlete.return_value = SimpleNamespace(
+            id=athlete.id, firstname=athlete.firstname, lastname=athlete.lastname, country="Testland"
+        )
+        client.get_activities.side_effect = lambda after=None, **_: (
+            strava_activity(values) for values in athlete.activities()
+            if after is None or values["start_date"] > after
+        )
+        return client
+    return make_client
+
+
+def run_suite(  # pylint: disable=too-many-arguments,too-many-locals
+    database, *, athletes=100, years=1, seed=0, sample=20, repeat=20, strava_latency=None,
+):
+    """
+    Run every benchmark on a club of {athletes} athletes over {years} years, stored in the
+    SQLite file {database}. The activities of the first {sample} athletes are left to the
+    sync benchmark; {sample} athletes are scored, and each leaderboard read {repeat} times.
+    The sync runs with a mocked Strava client or, with {strava_latency} (seconds per
+    request), with the real client against the local fake Strava server.
+    """
+    club = generate_club(athletes, years, seed)
+    with ExitStack() as stack:
+        if strava_latency is None:
+            origin = None
+            stack.enter_context(patch("contest.tasks.Client", side_effect=mocked_strava(club)))
+        else:
+            origin = stack.enter_context(FakeStrava(club=club, latency=strava_latency, seed=seed)).origin
+        results, dataset = _run_benchmarks(database, club, origin, sample, repeat)
+    return {
+        "dataset": {"athletes": athletes, "years": years, "seed": seed, **dataset},
+        "parameters": {"sample": sample, "repeat": repeat, "strava_latency": strava_latency},
+        "environment": {
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "machine": platform.machine(),
+        },
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def _run_benchmarks(database, club, strava_origin, sample, repeat):  # pylint: disable=too-many-locals
+    class BenchmarkConfig(Config):  # pylint: disable=too-few-public-methods
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{database}"
+        STRAVA_SYNC_WORKERS = 1
+        STRAVA_API_ORIGIN = strava_origin
+
+    sampled = club[:sample]
+    app = create_app(BenchmarkConfig)
+    app.logger.setLevel(logging.WARNING)
+    results = {}
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        store_club(club, athletes={athlete.id for athlete in club[len(sampled):]})
+        results["store_club"] = summary([time.perf_counter() - started])
+
+        results["sync_athlete"] = measure(
+            lambda athlete_id: sync_athlete(db.session.get(Athlete, athlete_id), full=True),
+            [(athlete.id,) for athlete in sampled],
+        )
+        results["compute_full"] = measure(lambda: compute(app, full=True), [()])
+
+        def compute_recent():
+            # As after a sync: the current week of every athlete changed
+            for athlete in club:
+                mark_weeks_dirty(athlete.id, [utcnow() - timedelta(days=1)])
+            db.session.commit()
+            started = time.perf_counter()
+            compute(app)
+            return time.perf_counter() - started
+        results["compute_incremental"] = summary([compute_recent() for _ in range(3)])
+
+        end = club[0].end if club else utcnow().date()
+        engine = ContestEngine([Standard(1), RegularityBonusA(2, None, None), RegularityBonusB(2)], end.year)
+        results["contest_engine_all_weeks"] = measure(
+            lambda athlete_id: engine.calculate_points_for_all_weeks(db.session.get(Athlete, athlete_id)),
+            [(athlete.id,) for athlete in sampled],
+        )
+
+        year, week = (end - timedelta(weeks=1)).isocalendar()[:2]
+        results["get_week_data"] = measure(get_week_data, [(year, week)] * repeat)
+        results["get_month_data"] = measure(get_month_data, [(year, week_month(year, week))] * repeat)
+        results["get_year_data"] = measure(get_year_data, [(year,)] * repeat)
+
+        dataset = {"end": end.isoformat(), "activities": db.session.query(db.func.count(Activity.id)).scalar()}
+    return results, dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--athletes", type=int, default=100, help="10 to 10,000")
+    parser.add_argument("--years", type=float, default=1, help="years of activities")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample", type=int, default=20, help="athletes synchronized and scored")
+    parser.add_argument("--repeat", type=int, default=20, help="reads of each leaderboard")
+    parser.add_argument(
+        "--strava-latency", type=float, help="sync against the local fake Strava server (seconds per request)"
+    )
+    parser.add_argument("--database", help="SQLite file to use (kept); default: a temporary one")
+    parser.add_argument("--output", help="JSON file to write; default: standard output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(args.database or Path(directory) / "benchmark.sqlite").resolve()
+        database.unlink(missing_ok=True)
+        results = run_suite(
+            database, athletes=args.athletes, years=args.years, seed=args.seed, sample=args.sample, repeat=args.repeat,
+            strava_latency=args.strava_latency,
+        )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,16 @@ class Config:  # pylint: disable=too-few-public-methods
     DATABASE_ENGINE = 'sqlite'
     DATABASE_FILE = os.environ.get('DATABASE_FILE') or os.path.join(STRAVACONTEST_DATA_ROOT, 'db.sqlite')
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_FILE}"
+    # SQLite connections: WAL journaling lets readers run while a transaction writes;
+    # writers wait up to {SQLITE_BUSY_TIMEOUT} ms for each other instead of failing with
+    # "database is locked". Page cache in KiB, memory-mapped I/O in bytes per connection
+    SQLITE_JOURNAL_MODE=os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS=os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT=os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000
+    SQLITE_CACHE_SIZE=os.environ.get('SQLITE_CACHE_SIZE') or 64 * 1024
+    SQLITE_MMAP_SIZE=os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024
+    # Separate pool of read-only connections for the leaderboard and exports (see sqlite.init_database)
+    SQLITE_READ_ENGINE=os.environ.get('SQLITE_READ_ENGINE', 'true').lower() == 'true'
 
     # STRAVA API
     STRAVA_REDIRECT_URI = os.environ.get('STRAVA_REDIRECT_URI') or 'http://localhost:5000/strava_callback'
@@ -13,6 +23,68 @@ class Config:  # pylint: disable=too-few-public-methods
     STRAVA_CLIENT_SECRET=os.environ.get('STRAVA_CLIENT_SECRET') or 'changeme'
     # Fetch activities from the last {STRAVA_REFRESH_INTERVAL} months
     STRAVA_REFRESH_INTERVAL=os.environ.get('STRAVA_REFRESH_INTERVAL') or 12
+    # Between full-window resyncs, only fetch activities after the last one seen,
+    # minus {STRAVA_SYNC_OVERLAP} hours (late uploads)
+    STRAVA_SYNC_OVERLAP=os.environ.get('STRAVA_SYNC_OVERLAP') or 72
+    # Refetch the whole {STRAVA_REFRESH_INTERVAL} window every {STRAVA_FULL_SYNC_INTERVAL} hours
+    STRAVA_FULL_SYNC_INTERVAL=os.environ.get('STRAVA_FULL_SYNC_INTERVAL') or 24
+    # Strava API quota (15-minute and daily read limits). Corrected from the rate-limit
+    # headers of every response; {STRAVA_RATE_LIMIT_RESERVE} calls are kept for
+    # onboarding and push events. Athletes that don't fit are deferred to the next run.
+    STRAVA_RATE_LIMIT_SHORT=os.environ.get('STRAVA_RATE_LIMIT_SHORT') or 100
+    STRAVA_RATE_LIMIT_LONG=os.environ.get('STRAVA_RATE_LIMIT_LONG') or 1000
+    STRAVA_RATE_LIMIT_RESERVE=os.environ.get('STRAVA_RATE_LIMIT_RESERVE') or 10
+    # Athletes with an activity in the last {STRAVA_ACTIVE_DAYS} days are synchronized first
+    STRAVA_ACTIVE_DAYS=os.environ.get('STRAVA_ACTIVE_DAYS') or 14
+    # Each athlete is synchronized again after an interval between these bounds (minutes),
+    # growing with their inactivity (see tasks.sync_interval); activities over the last
+    # {STRAVA_CADENCE_DAYS} days give their usual upload cadence
+    STRAVA_SYNC_MIN_INTERVAL=os.environ.get('STRAVA_SYNC_MIN_INTERVAL') or 15
+    STRAVA_SYNC_MAX_INTERVAL=os.environ.get('STRAVA_SYNC_MAX_INTERVAL') or 24 * 60
+    STRAVA_CADENCE_DAYS=os.environ.get('STRAVA_CADENCE_DAYS') or 28
+    # Minutes between two polling ticks; each tick only synchronizes the athletes due
+    # (see STRAVA_SYNC_MIN_INTERVAL). With the push subscription (webhook) enabled,
+    # polling is only a safety net and can run much less often (e.g. 360)
+    STRAVA_SYNC_INTERVAL=os.environ.get('STRAVA_SYNC_INTERVAL') or 15
+    # Push subscription: token echoed during the validation handshake, and id of the
+    # subscription (events are refused until it is set)
+    STRAVA_WEBHOOK_VERIFY_TOKEN=os.environ.get('STRAVA_WEBHOOK_VERIFY_TOKEN') or 'changeme'
+    STRAVA_WEBHOOK_SUBSCRIPTION_ID=os.environ.get('STRAVA_WEBHOOK_SUBSCRIPTION_ID')
+    # Process push events in a background worker (False: within the request)
+    STRAVA_WEBHOOK_ASYNC = True
+    # Every process may run the scheduler: a database lease lets only one of them run the
+    # sync at a time, once per {STRAVA_SYNC_INTERVAL}, renewed every third of {SCHEDULER_LEASE_TTL}
+    # seconds while it runs
+    SCHEDULER_LEASE_TTL=os.environ.get('SCHEDULER_LEASE_TTL') or 120
+    # Import the activities of a newly linked athlete in a background worker (False: within the request)
+    STRAVA_ONBOARDING_ASYNC = True
+    # HTTP connections to the Strava API, shared by all the athletes' clients and kept
+    # alive between calls; timeouts in seconds
+    STRAVA_HTTP_POOL_SIZE=os.environ.get('STRAVA_HTTP_POOL_SIZE') or 10
+    STRAVA_HTTP_CONNECT_TIMEOUT=os.environ.get('STRAVA_HTTP_CONNECT_TIMEOUT') or 5
+    STRAVA_HTTP_READ_TIMEOUT=os.environ.get('STRAVA_HTTP_READ_TIMEOUT') or 30
+    # Send the Strava API calls to another server instead, e.g. http://127.0.0.1:8081 (fake server)
+    STRAVA_API_ORIGIN=os.environ.get('STRAVA_API_ORIGIN')
+    # Number of athletes synchronized concurrently (1 = sequential)
+    STRAVA_SYNC_WORKERS=os.environ.get('STRAVA_SYNC_WORKERS') or 4
+    # Activities written per batch (one SELECT, one INSERT/UPDATE and one commit per batch)
+    STRAVA_SYNC_BATCH_SIZE=os.environ.get('STRAVA_SYNC_BATCH_SIZE') or 200
+    # Pages of activities fetched ahead while the previous ones are written
+    STRAVA_SYNC_PREFETCH=os.environ.get('STRAVA_SYNC_PREFETCH') or 2
+
+    # Hours during which the points replaced by a full recompute are kept (flask compute-points --rollback)
+    POINTS_RETENTION=os.environ.get('POINTS_RETENTION') or 72
+
+    # Leaderboard responses cached per process, per (year, month, week, leaderboard version)
+    LEADERBOARD_CACHE_SIZE=os.environ.get('LEADERBOARD_CACHE_SIZE') or 256
+
+    # Metrics (/metrics): with several worker processes, a directory shared by all of them,
+    # where each one writes its values every {METRICS_FLUSH_INTERVAL} seconds (see metrics.py)
+    METRICS_DIR=os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL=os.environ.get('METRICS_FLUSH_INTERVAL') or 5
+
+    # Seconds between two checks of the SiteConfig version (changes saved by another process)
+    SITE_CONFIG_CHECK_INTERVAL=os.environ.get('SITE_CONFIG_CHECK_INTERVAL') or 5
 
     # WTF Form crsf
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
@@ -27,3 +99,8 @@ class TestConfig(Config):  # pylint: disable=too-few-public-methods
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
     TESTING = True
+    # An in-memory database is a single shared connection: keep sync sequential
+    STRAVA_SYNC_WORKERS = 1
+    STRAVA_WEBHOOK_ASYNC = False
+    STRAVA_WEBHOOK_SUBSCRIPTION_ID = 1
+    STRAVA_ONBOARDING_ASYNC = False
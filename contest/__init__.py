@@ -8,8 +8,13 @@ from .extensions import db
 from .models import User
 from .api import api
 from .auth import auth
+from .export import export
+from .metrics import init_metrics, metrics
+from .sqlite import init_database
 from .strava import strava
+from .tasks import compute_points_command
 from .views import views
+from .webhook import webhook
 
 migrate = Migrate()
 csrf = CSRFProtect()
@@ -22,7 +27,8 @@ def create_app(config_class=Config)  -> Flask:
     app.logger.setLevel(logging.INFO)
 
     # Extensions
-    db.init_app(app)
+    init_database(app)
+    init_metrics(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
     logging.basicConfig()
@@ -38,9 +44,17 @@ def create_app(config_class=Config)  -> Flask:
 
     # Register blueprints
     app.register_blueprint(api, url_prefix="/api/v1")
+    app.register_blueprint(export, url_prefix="/api/v1/export")
     app.register_blueprint(views)
     app.register_blueprint(auth)
     app.register_blueprint(strava, url_prefix="/strava")
+    app.register_blueprint(webhook, url_prefix="/strava")
+    app.register_blueprint(metrics)
+    # Strava push events are not form posts: they can't carry a CSRF token
+    csrf.exempt(webhook)
+
+    # CLI
+    app.cli.add_command(compute_points_command)
 
     ## Error handlers
     @app.errorhandler(404)
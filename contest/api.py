@@ -1,13 +1,23 @@
+import base64
 import calendar
+import hashlib
+import json
 from datetime import datetime, date, timedelta
 from typing import Tuple
 import flask
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_login import current_user, login_required
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import undefer
+from .extensions import db, read_only
 from .models import (
-    Athlete, Activity, Point
+    Athlete, Activity, JobReport, MonthPoint, OnboardingJob, Point, YearPoint
 )
-from .extensions import db
+from .generations import active_points_generation
+from .leaderboard import get_leaderboard_cache, get_month_weeks, leaderboard_version
+from .ratelimit import get_rate_budget
+from .tasks import STRAVA_SYNC_REPORT
+from .views import admin_required
 
 api = Blueprint("api", __name__)
 
@@ -35,14 +45,32 @@ def get_my_activities():
     if not current_user.athlete_id:
         return jsonify({"error": "No athlete linked"}), 404
 
+    # Offset pagination (page/per_page, with total and pages), or keyset pagination
+    # when a cursor is given (see get_activities_after)
     page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 10, type=int)
+    per_page = max(request.args.get("per_page", 10, type=int), 1)
+    # Opt-in fields, e.g. ?fields=polyline
+    fields = {field for field in request.args.get("fields", "").split(",") if field}
+    unknown_fields = fields - set(Activity.OPTIONAL_FIELDS)
+    if unknown_fields:
+        return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown_fields))}"}), 400
 
     activities_query = current_user.athlete.activities.order_by(
-        Activity.start_date.desc()
+        Activity.start_date.desc(), Activity.id.desc()
     )
+    if "polyline" in fields:
+        activities_query = activities_query.options(undefer(Activity.polyline))
+    if "cursor" in request.args:
+        try:
+            return jsonify(get_activities_after(
+                activities_query, request.args["cursor"], per_page, fields,
+                with_total=request.args.get("total", 0, type=int) == 1,
+            )), 200
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+
     pagination = activities_query.paginate(page=page, per_page=per_page, error_out=False)
-    activities = [a.to_dict() for a in pagination.items]
+    activities = [a.to_dict(fields) for a in pagination.items]
 
     return jsonify({
         "activities": activities,
@@ -53,9 +81,96 @@ def get_my_activities():
     }), 200
 
 
-def get_week_data(year, week):
+def encode_cursor(activity, total):
+    """Opaque cursor: position (start_date, id) of the last activity sent, and the cached total."""
+    position = {
+        "start_date": activity.start_date.isoformat() if activity.start_date else None,
+        "id": activity.id,
+        "total": total,
+    }
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (start_date, id, total) from a cursor (see encode_cursor), raise ValueError if invalid."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        start_date = position["start_date"]
+        return (
+            datetime.fromisoformat(start_date) if start_date else None,
+            int(position["id"]),
+            position["total"],
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def get_activities_after(activities_query, cursor, per_page, fields, with_total=False):
+    """
+    Keyset pagination of {activities_query} (ordered by start_date desc, id desc): the page
+    following {cursor} (empty: first page) is read through the index, without OFFSET, so
+    every page costs the same. The total is only counted on the first page when
+    {with_total}, then carried by the cursors.
+    """
+    total = None
+    if cursor:
+        start_date, activity_id, total = decode_cursor(cursor)
+        if start_date is None:
+            activities_query = activities_query.filter(
+                Activity.start_date.is_(None), Activity.id < activity_id
+            )
+        else:
+            activities_query = activities_query.filter(or_(
+                Activity.start_date < start_date,
+                and_(Activity.start_date == start_date, Activity.id < activity_id),
+                Activity.start_date.is_(None),
+            ))
+    elif with_total:
+        total = activities_query.order_by(None).count()
+
+    # One more row tells whether there is a next page
+    activities = activities_query.limit(per_page + 1).all()
+    next_cursor = encode_cursor(activities[per_page - 1], total) if len(activities) > per_page else None
+    return {
+        "activities": [a.to_dict(fields) for a in activities[:per_page]],
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "total": total,
+    }
+
+
+@api.route("/onboarding", methods=["GET"])
+@login_required
+def get_onboarding_status():
+    """Progress of the first import of the logged-in athlete's activities (see onboarding.py)."""
+    job = db.session.get(OnboardingJob, current_user.athlete_id) if current_user.athlete_id else None
+    if job is None:
+        return jsonify({"error": "No onboarding"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@api.route("/sync/status", methods=["GET"])
+@admin_required
+def get_sync_status():
+    """
+    Strava API budget and sync queue depth, to size the club against the quota. Both are
+    those of the last sync, whichever process ran it; before any, the budget of this process.
+    """
+    report = db.session.get(JobReport, STRAVA_SYNC_REPORT)
+    last_sync = {**json.loads(report.summary), "finished_at": report.finished_at.isoformat()} if report else None
+    return jsonify({
+        "budget": last_sync.pop("budget") if last_sync else get_rate_budget(current_app).snapshot(),
+        "athletes": Athlete.query.filter(Athlete.access_token.isnot(None)).count(),
+        "queue_depth": len(last_sync["deferred"]) if last_sync else 0,
+        "last_sync": last_sync,
+    }), 200
+
+
+def get_week_data(year, week, generation=None):
+    if generation is None:
+        generation = active_points_generation()
     week_points = (
-        Point.query.filter_by(year=year, week_number=week)
+        Point.query.filter_by(year=year, week_number=week, generation=generation)
         .order_by(Point.total_points.desc())
         .join(Athlete)
         .all()
@@ -71,80 +186,56 @@ def get_week_data(year, week):
     ]
 
 
-def get_month_weeks(year, month):
-    """Return the list of ISO week numbers to include in the month (weeks with ≥ 4 days in the month)."""
-    cal = calendar.Calendar()
-    month_weeks = []
-    for week_tuple in cal.monthdatescalendar(year, month):
-        days_in_month = [d for d in week_tuple if d.month == month]
-        if len(days_in_month) >= 4:
-            week_number = week_tuple[0].isocalendar()[1]
-            # Correction for week 1 of January, which may be week 52 or 53 of the previous year.
-            if week_number == 1 and month == 12 and week_tuple[0].month == 1:
-                week_number = date(year, 12, 31).isocalendar()[1]
-            month_weeks.append(week_number)
-    return sorted(set(month_weeks))
-
-
-def get_month_data(year, month_weeks):
+def get_month_data(year, month, generation=None):
+    """Month leaderboard, read from the materialized totals (see leaderboard.refresh_month)."""
+    if generation is None:
+        generation = active_points_generation()
     month_points_query = (
-        Point.query.filter(Point.year == year, Point.week_number.in_(month_weeks))
+        MonthPoint.query.filter_by(year=year, month=month, generation=generation)
         .join(Athlete)
-        .with_entities(
-            Point.athlete_id,
-            Athlete.firstname,
-            Athlete.lastname,
-            db.func.sum(Point.total_points).label('total_points')
-        )
-        .group_by(Point.athlete_id, Athlete.firstname, Athlete.lastname)
-        .order_by(db.desc('total_points'))
+        .with_entities(MonthPoint.rank, Athlete.firstname, Athlete.lastname, MonthPoint.total_points)
+        .order_by(MonthPoint.rank)
     )
     return [
         {
-            "rank": i + 1,
+            "rank": row.rank,
             "firstname": row.firstname,
             "lastname": row.lastname,
             "points": row.total_points
         }
-        for i, row in enumerate(month_points_query)
+        for row in month_points_query
     ]
 
 
-def get_year_data(year):
+def get_year_data(year, generation=None):
+    """Year leaderboard, read from the materialized totals (see leaderboard.refresh_year)."""
+    if generation is None:
+        generation = active_points_generation()
     year_points_query = (
-        Point.query.filter_by(year=year)
+        YearPoint.query.filter_by(year=year, generation=generation)
         .join(Athlete)
-        .with_entities(
-            Point.athlete_id,
-            Athlete.firstname,
-            Athlete.lastname,
-            db.func.sum(Point.total_points).label('total_points')
-        )
-        .group_by(Point.athlete_id, Athlete.firstname, Athlete.lastname)
-        .order_by(db.desc('total_points'))
+        .with_entities(YearPoint.rank, Athlete.firstname, Athlete.lastname, YearPoint.total_points)
+        .order_by(YearPoint.rank)
     )
     return [
         {
-            "rank": i + 1,
+            "rank": row.rank,
             "firstname": row.firstname,
             "lastname": row.lastname,
             "points": row.total_points
         }
-        for i, row in enumerate(year_points_query)
+        for row in year_points_query
     ]
 
 
-@api.route("/leaderboard", methods=["GET"])
-def leaderboard():
-    today = datetime.today()
-    week = int(request.args.get('week', today.isocalendar()[1]))
-    year = int(request.args.get('year', today.year))
-    month = int(request.args.get('month', today.month))
-
-    week_data = get_week_data(year, week)
+def get_leaderboard_data(year, month, week):
+    # Read once: every part of the leaderboard comes from the same generation, even if a
+    # full recompute activates a new one meanwhile
+    generation = active_points_generation()
+    week_data = get_week_data(year, week, generation)
     month_weeks = get_month_weeks(year, month)
-    month_data = get_month_data(year, month_weeks)
-    year_data = get_year_data(year)
+    month_data = get_month_data(year, month, generation)
+    year_data = get_year_data(year, generation)
 
     try:
         week_start = date.fromisocalendar(year, week, 1)
@@ -154,7 +245,7 @@ def leaderboard():
 
     month_name = calendar.month_name[month]
 
-    return jsonify({
+    return {
         "week": week,
         "month": month,
         "year": year,
@@ -165,4 +256,32 @@ def leaderboard():
         "week_end": week_end.strftime("%a %d %b") if week_end else "",
         "month_name": month_name,
         "month_weeks": month_weeks,  # <-- Ajouté ici
-    })
+    }
+
+
+@api.route("/leaderboard", methods=["GET"])
+def leaderboard():
+    """
+    Leaderboard of a week, month and year. The serialized payload is cached until the next
+    points computation (see leaderboard.bump_leaderboard_version), and tagged with a strong ETag
+    so that clients can revalidate with If-None-Match (304).
+    """
+    today = datetime.today()
+    week = int(request.args.get('week', today.isocalendar()[1]))
+    year = int(request.args.get('year', today.year))
+    month = int(request.args.get('month', today.month))
+
+    cache = get_leaderboard_cache(current_app)
+    key = (year, month, week, leaderboard_version())
+    cached = cache.get(key)
+    if cached is None:
+        with read_only():
+            data = get_leaderboard_data(year, month, week)
+        body = current_app.json.response(data).get_data()
+        cached = (body, hashlib.sha256(body).hexdigest())
+        cache.put(key, cached)
+
+    body, etag = cached
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    return response.make_conditional(request)
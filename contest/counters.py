@@ -0,0 +1,17 @@
+from .extensions import db
+from .models import Counter
+
+
+def counter_value(name):
+    """Return the value of the counter {name} (0 if never bumped)."""
+    counter = db.session.get(Counter, name, populate_existing=True)
+    return counter.value if counter else 0
+
+
+def bump_counter(name):
+    """Increment the counter {name}, within the current transaction."""
+    bumped = db.session.execute(
+        db.update(Counter).where(Counter.name == name).values(value=Counter.value + 1)
+    ).rowcount
+    if not bumped:
+        db.session.execute(db.insert(Counter).values(name=name, value=1))
@@ -0,0 +1,99 @@
+import json
+from datetime import date, datetime, time, timedelta
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy import tuple_
+from .extensions import db, read_only
+from .generations import active_points_generation
+from .models import Activity, Point
+from .views import admin_required
+
+export = Blueprint("export", __name__)
+
+# Rows fetched per round trip while streaming: memory stays bounded whatever the export size
+EXPORT_BATCH_SIZE = 1000
+
+ACTIVITY_COLUMNS = (
+    Activity.id, Activity.athlete_id, Activity.name, Activity.distance, Activity.moving_time,
+    Activity.elapsed_time, Activity.start_date, Activity.total_elevation_gain, Activity.type,
+    Activity.has_map, Activity.photo_count,
+)
+POINT_COLUMNS = (Point.athlete_id, Point.year, Point.week_number, Point.total_points)
+
+
+def date_arg(name):
+    """Return the date of the query argument {name} (YYYY-MM-DD), None if missing, raise ValueError if invalid."""
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+
+def activities_query(athlete_id=None):
+    """Activities of {athlete_id} (None: all), filtered by the after/before (inclusive), type and fields arguments."""
+    fields = {field for field in request.args.get("fields", "").split(",") if field}
+    if fields - set(Activity.OPTIONAL_FIELDS):
+        raise ValueError(f"Unknown fields: {', '.join(sorted(fields - set(Activity.OPTIONAL_FIELDS)))}")
+    columns = ACTIVITY_COLUMNS + ((Activity.polyline,) if "polyline" in fields else ())
+    query = db.select(*columns).order_by(Activity.athlete_id, Activity.start_date, Activity.id)
+    if athlete_id is not None:
+        query = query.where(Activity.athlete_id == athlete_id)
+    if after := date_arg("after"):
+        query = query.where(Activity.start_date >= datetime.combine(after, time.min))
+    if before := date_arg("before"):
+        query = query.where(Activity.start_date < datetime.combine(before + timedelta(days=1), time.min))
+    if activity_type := request.args.get("type"):
+        query = query.where(Activity.type == activity_type)
+    return query
+
+
+def points_query(athlete_id=None):
+    """Weekly points of {athlete_id} (None: all), for the ISO weeks overlapping the after/before arguments."""
+    query = (
+        db.select(*POINT_COLUMNS)
+        .where(Point.generation == active_points_generation())
+        .order_by(Point.athlete_id, Point.year, Point.week_number)
+    )
+    if athlete_id is not None:
+        query = query.where(Point.athlete_id == athlete_id)
+    week = tuple_(Point.year, Point.week_number)
+    if after := date_arg("after"):
+        query = query.where(week >= tuple_(*after.isocalendar()[:2]))
+    if before := date_arg("before"):
+        query = query.where(week <= tuple_(*before.isocalendar()[:2]))
+    return query
+
+
+EXPORT_QUERIES = {"activities": activities_query, "points": points_query}
+
+
+def ndjson_response(query):
+    """Stream the rows of {query} as NDJSON (one JSON object per line), {EXPORT_BATCH_SIZE} rows at a time."""
+    def generate():
+        with read_only():
+            rows = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            for row in rows:
+                yield json.dumps(row._asdict(), default=lambda value: value.isoformat()) + "\n"
+    return current_app.response_class(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def export_response(kind, athlete_id):
+    try:
+        query = EXPORT_QUERIES[kind](athlete_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return ndjson_response(query)
+
+
+@export.route("/<any(activities, points):kind>", methods=["GET"])
+@login_required
+def export_mine(kind):
+    """Export the activities or points of the logged-in athlete."""
+    if not current_user.athlete_id:
+        return jsonify({"error": "No athlete linked"}), 404
+    return export_response(kind, current_user.athlete_id)
+
+
+@export.route("/all/<any(activities, points):kind>", methods=["GET"])
+@admin_required
+def export_all(kind):
+    """Export the activities or points of every athlete, or of the athlete_id argument."""
+    return export_response(kind, request.args.get("athlete_id", type=int))
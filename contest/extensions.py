@@ -1,3 +1,31 @@
+from contextlib import contextmanager
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 
-db = SQLAlchemy()
+# app.extensions key of the optional read-only engine (see sqlite.init_database)
+READ_ENGINE = "sqlite_read_engine"
+
+
+class RoutingSession(Session):
+    """Session of db.session: within read_only(), queries run on the READ_ENGINE if there is one."""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("read_only") and not self._flushing:
+            engine = current_app.extensions.get(READ_ENGINE)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+@contextmanager
+def read_only():
+    """Send the queries of the block to the read engine: they don't wait for the writers' pool."""
+    previous = db.session.info.get("read_only", False)
+    db.session.info["read_only"] = True
+    try:
+        yield
+    finally:
+        db.session.info["read_only"] = previous
@@ -0,0 +1,104 @@
+from .extensions import db
+from .leaderboard import bump_leaderboard_version
+from .models import (
+    GENERATION_ACTIVE, GENERATION_BUILDING, GENERATION_FAILED, GENERATION_RETIRED,
+    MonthPoint, Point, PointsGeneration, YearPoint,
+)
+
+# Tables holding one set of rows per points generation
+GENERATION_MODELS = (Point, MonthPoint, YearPoint)
+
+
+def active_points_generation():
+    """Return the generation of the points shown by the leaderboards."""
+    active = db.session.execute(
+        db.select(PointsGeneration.id).where(PointsGeneration.status == GENERATION_ACTIVE)
+    ).scalar()
+    return active or 0
+
+
+def writable_generations(now, retention):
+    """
+    Generations kept up to date by the incremental computes: the active one, the one being
+    built if any, and the retired ones still kept for a rollback (see previous_generation),
+    which would show stale points otherwise.
+    """
+    others = db.session.execute(
+        db.select(PointsGeneration.id).where(
+            (PointsGeneration.status == GENERATION_BUILDING)
+            | ((PointsGeneration.status == GENERATION_RETIRED) & (PointsGeneration.retired_at >= now - retention))
+        ).order_by(PointsGeneration.id)
+    ).scalars().all()
+    return [active_points_generation(), *others]
+
+
+def start_generation(now):
+    """
+    Create a new (empty) generation to build, abandoning any other one left unfinished,
+    e.g. by a crash. Committed; return its id.
+    """
+    for stale in PointsGeneration.query.filter_by(status=GENERATION_BUILDING):
+        fail_generation(stale.id, now)
+    last = db.session.execute(db.select(db.func.max(PointsGeneration.id))).scalar() or 0
+    generation = PointsGeneration(
+        id=max(last, active_points_generation()) + 1, status=GENERATION_BUILDING, started_at=now
+    )
+    db.session.add(generation)
+    db.session.commit()
+    return generation.id
+
+
+def fail_generation(generation_id, now):
+    """Abandon a generation being built: its rows are deleted by purge_generations. Committed."""
+    generation = db.session.get(PointsGeneration, generation_id)
+    generation.status = GENERATION_FAILED
+    generation.retired_at = now
+    db.session.commit()
+
+
+def activate_generation(generation_id, now):
+    """
+    Show the points of {generation_id} instead of the active generation, which is retired.
+    Two row updates, whatever the number of points: readers see either generation entirely.
+    Committed.
+    """
+    active_id = active_points_generation()
+    # Generation 0 has no row until it is retired for the first time
+    active = db.session.get(PointsGeneration, active_id) or PointsGeneration(id=active_id)
+    active.status = GENERATION_RETIRED
+    active.retired_at = now
+    db.session.add(active)
+    generation = db.session.get(PointsGeneration, generation_id)
+    generation.status = GENERATION_ACTIVE
+    generation.activated_at = now
+    generation.retired_at = None
+    bump_leaderboard_version()
+    db.session.commit()
+
+
+def previous_generation(now, retention):
+    """Return the last generation retired less than {retention} ago (its points are still kept), or None."""
+    return (
+        PointsGeneration.query
+        .filter(PointsGeneration.status == GENERATION_RETIRED, PointsGeneration.retired_at >= now - retention)
+        .order_by(PointsGeneration.retired_at.desc(), PointsGeneration.id.desc())
+        .first()
+    )
+
+
+def purge_generations(now, retention):
+    """Delete the points of the generations retired more than {retention} ago, and of the failed ones."""
+    expired = db.session.execute(
+        db.select(PointsGeneration.id).where(
+            (PointsGeneration.status == GENERATION_FAILED)
+            | ((PointsGeneration.status == GENERATION_RETIRED) & (PointsGeneration.retired_at < now - retention))
+        )
+    ).scalars().all()
+    if not expired:
+        return 0
+    # Bulk deletes: these rows are not visible, the leaderboards don't need a refresh
+    for model in GENERATION_MODELS:
+        db.session.execute(db.delete(model).where(model.generation.in_(expired)))
+    db.session.execute(db.delete(PointsGeneration).where(PointsGeneration.id.in_(expired)))
+    db.session.commit()
+    return len(expired)
@@ -0,0 +1,179 @@
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import event
+from .counters import bump_counter, counter_value
+from .extensions import db
+from .models import GENERATION_BUILDING, MonthPoint, Point, PointsGeneration, YearPoint
+
+# Counter bumped by every transaction changing points: cached leaderboards of an older
+# version are stale (not to be confused with the points generations, see generations.py)
+LEADERBOARD_VERSION = "leaderboard_version"
+
+
+def get_month_weeks(year, month):
+    """Return the list of ISO week numbers to include in the month (weeks with ≥ 4 days in the month)."""
+    cal = calendar.Calendar()
+    month_weeks = []
+    for week_tuple in cal.monthdatescalendar(year, month):
+        days_in_month = [d for d in week_tuple if d.month == month]
+        if len(days_in_month) >= 4:
+            week_number = week_tuple[0].isocalendar()[1]
+            # Correction for week 1 of January, which may be week 52 or 53 of the previous year.
+            if week_number == 1 and month == 12 and week_tuple[0].month == 1:
+                week_number = date(year, 12, 31).isocalendar()[1]
+            month_weeks.append(week_number)
+    return sorted(set(month_weeks))
+
+
+def week_month(year, week):
+    """
+    Return the month whose leaderboard includes an ISO week (see get_month_weeks), or None
+    for an invalid week. A week has ≥ 4 days in a month exactly when its Thursday does.
+    """
+    try:
+        return date.fromisocalendar(year, week, 4).month
+    except ValueError:
+        return None
+
+
+def _store_ranking(model, period, rows):
+    """Replace the materialized ranking of a period with {rows} (athlete_id, total) sorted by rank."""
+    db.session.execute(db.delete(model).filter_by(**period))
+    if rows:
+        db.session.execute(db.insert(model), [
+            {**period, "athlete_id": athlete_id, "total_points": total, "rank": rank}
+            for rank, (athlete_id, total) in enumerate(rows, start=1)
+        ])
+
+
+def _ranked_totals(generation, *criteria):
+    """Sum the points of {generation} of every athlete matching {criteria}, best first."""
+    total = db.func.sum(Point.total_points)
+    return db.session.execute(
+        db.select(Point.athlete_id, total)
+        .where(Point.generation == generation, *criteria)
+        .group_by(Point.athlete_id)
+        .order_by(total.desc(), Point.athlete_id)
+    ).all()
+
+
+def refresh_month(year, month, generation=0):
+    """Rebuild the materialized month totals and ranks of a month."""
+    _store_ranking(MonthPoint, {"year": year, "month": month, "generation": generation}, _ranked_totals(
+        generation, Point.year == year, Point.week_number.in_(get_month_weeks(year, month))
+    ))
+
+
+def refresh_year(year, generation=0):
+    """Rebuild the materialized year totals and ranks of a year."""
+    _store_ranking(YearPoint, {"year": year, "generation": generation}, _ranked_totals(generation, Point.year == year))
+
+
+def refresh_leaderboards(weeks, generation=0):
+    """Rebuild the month and year leaderboards of {generation} containing the given (year, week)."""
+    for year, month in sorted({(year, week_month(year, week)) for year, week in weeks}):
+        if month is not None:
+            refresh_month(year, month, generation)
+    for year in sorted({year for year, _ in weeks}):
+        refresh_year(year, generation)
+
+
+def rebuild_leaderboards(generation=0):
+    """Rebuild every materialized month and year leaderboard of {generation} from the Point table."""
+    db.session.execute(db.delete(MonthPoint).filter_by(generation=generation))
+    db.session.execute(db.delete(YearPoint).filter_by(generation=generation))
+    refresh_leaderboards(db.session.execute(
+        db.select(Point.year, Point.week_number).where(Point.generation == generation).distinct()
+    ).all(), generation)
+
+
+def leaderboard_version():
+    """Return the leaderboard version (see LEADERBOARD_VERSION)."""
+    return counter_value(LEADERBOARD_VERSION)
+
+
+def bump_leaderboard_version():
+    """Increment the leaderboard version, within the current transaction."""
+    bump_counter(LEADERBOARD_VERSION)
+
+
+class LeaderboardCache:
+    """
+    Bounded LRU cache of the leaderboard responses, keyed by (year, month, week, leaderboard
+    version). Entries of older versions are dropped as soon as a newer version is cached.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        version = key[-1]
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._entries.clear()
+                self._version = version
+            elif version < self._version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+
+def get_leaderboard_cache(app) -> LeaderboardCache:
+    """Return the app-wide leaderboard response cache."""
+    if "leaderboard_cache" not in app.extensions:
+        app.extensions.setdefault("leaderboard_cache", LeaderboardCache(int(app.config["LEADERBOARD_CACHE_SIZE"])))
+    return app.extensions["leaderboard_cache"]
+
+
+# The leaderboards are kept up to date within the transaction writing the points: the
+# weeks of the Point rows added, changed or deleted in a session are collected at
+# flush time, and their months/years rebuilt right before the commit, along with a
+# bump of the leaderboard version. Generations being built are left out.
+
+@event.listens_for(db.session, "before_flush")
+def _collect_point_weeks(session, _flush_context, _instances):
+    weeks = session.info.setdefault("leaderboard_weeks", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Point):
+            weeks.add((instance.generation or 0, instance.year, instance.week_number))
+
+
+@event.listens_for(db.session, "before_commit")
+def _refresh_leaderboards(session):
+    session.flush()
+    weeks = session.info.pop("leaderboard_weeks", None)
+    if not weeks:
+        return
+    # The leaderboards of a generation being built are built once it is complete (see
+    # tasks.compute_full), and not shown until then
+    building = set(session.execute(
+        db.select(PointsGeneration.id).where(PointsGeneration.status == GENERATION_BUILDING)
+    ).scalars())
+    generations = sorted({generation for generation, _, _ in weeks} - building)
+    for generation in generations:
+        refresh_leaderboards([week[1:] for week in weeks if week[0] == generation], generation)
+    if generations:
+        bump_leaderboard_version()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_point_weeks(session):
+    session.info.pop("leaderboard_weeks", None)
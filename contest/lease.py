@@ -0,0 +1,126 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import Lease
+from .tasks import utcnow
+
+# Identifies this process as a lease holder
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class DatabaseLease:
+    """
+    Named lease stored in the Lease table: held by a single process until it expires
+    ({ttl}), renewed by its holder, taken over by another process once expired. Works on
+    its own connections, independently of the ORM session of the caller.
+    """
+    def __init__(self, engine, name, ttl: timedelta, holder=PROCESS_ID):
+        self.engine = engine
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder
+
+    def acquire(self) -> bool:
+        """Take or renew the lease. Return False if another process holds it."""
+        now = utcnow()
+        table = Lease.__table__
+        with self.engine.begin() as connection:
+            taken = connection.execute(
+                table.update()
+                .where(table.c.name == self.name, (table.c.holder == self.holder) | (table.c.expires_at <= now))
+                .values(holder=self.holder, expires_at=now + self.ttl)
+            ).rowcount
+        if taken:
+            return True
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(table.insert().values(name=self.name, holder=self.holder, expires_at=now + self.ttl))
+        except IntegrityError:
+            return False
+        return True
+
+    def claim_run(self, interval: timedelta) -> bool:
+        """
+        Record the start of a run of the guarded job, unless the previous one started less
+        than {interval} ago. The lease must be held.
+        """
+        now = utcnow()
+        table = Lease.__table__
+        with self.engine.begin() as connection:
+            return connection.execute(
+                table.update()
+                .where(
+                    table.c.name == self.name, table.c.holder == self.holder,
+                    table.c.last_run_at.is_(None) | (table.c.last_run_at <= now - interval),
+                )
+                .values(last_run_at=now)
+            ).rowcount > 0
+
+    def release(self):
+        """Let the lease expire right away, if still held."""
+        table = Lease.__table__
+        with self.engine.begin() as connection:
+            connection.execute(
+                table.update()
+                .where(table.c.name == self.name, table.c.holder == self.holder)
+                .values(expires_at=utcnow())
+            )
+
+
+def run_exclusive(app, name, func, *args, interval=None):
+    """
+    Run {func}(*args, stop=<Event>) unless another process holds the lease {name}, or
+    the previous run (of any process) started less than {interval} ago: with a scheduler
+    in every process, the job runs once per interval, not once per process. The lease
+    (SCHEDULER_LEASE_TTL seconds) is renewed by a heartbeat while {func} runs, so a run
+    longer than the scheduling interval keeps the other processes out (their runs are
+    skipped, i.e. coalesced). If the heartbeat fails to renew it (e.g. the process was
+    paused past the TTL and another one took over), the stop event is set and {func} is
+    expected to wind down.
+    Return True if {func} ran.
+    """
+    with app.app_context():
+        engine = db.engine
+    lease = DatabaseLease(engine, name, timedelta(seconds=float(app.config["SCHEDULER_LEASE_TTL"])))
+    if not lease.acquire():
+        app.logger.info('Skipping %s: lease held by another process', name)
+        return False
+    if interval is not None and not lease.claim_run(interval):
+        lease.release()
+        app.logger.info('Skipping %s: already run less than %s ago', name, interval)
+        return False
+
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def heartbeat():
+        renewed = time.monotonic()
+        while not stop.wait(lease.ttl.total_seconds() / 3):
+            try:
+                held = lease.acquire()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # e.g. "database is locked": retried until the lease would expire
+                app.logger.exception('Failed to renew the %s lease', name)
+                held = time.monotonic() - renewed < lease.ttl.total_seconds() * 2 / 3
+            else:
+                renewed = time.monotonic()
+            if not held:
+                app.logger.error('Lost the %s lease, stopping', name)
+                lost.set()
+                return
+
+    heartbeat_thread = threading.Thread(target=heartbeat, name=f"lease-{name}", daemon=True)
+    heartbeat_thread.start()
+    try:
+        func(*args, stop=lost)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+        if not lost.is_set():
+            lease.release()
+    return True
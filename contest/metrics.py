@@ -0,0 +1,251 @@
+"""
+Prometheus metrics of the Strava sync, the points computation and the web requests,
+served on /metrics in the text exposition format.
+
+Each process records into its own registry, in memory: recording a value is a dict update
+under a lock. With METRICS_DIR set, every process also writes a snapshot of its registry
+to <METRICS_DIR>/<pid>.json every METRICS_FLUSH_INTERVAL seconds, and /metrics adds up the
+snapshots of all the processes (the sync runs in whichever process holds the scheduler
+lease, while any of them may be scraped). Counters and histograms are summed, gauges
+(timestamps) take the highest value.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Blueprint, Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from .extensions import db
+from .models import Point
+
+COUNTER, GAUGE, HISTOGRAM = "counter", "gauge", "histogram"
+# Histogram buckets (seconds) of the web requests, and of the sync and compute jobs
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    "contest_athlete_sync_duration_seconds": (
+        HISTOGRAM, "Duration of the synchronization of an athlete by the scheduled sync.", JOB_BUCKETS),
+    "contest_athlete_syncs_total": (COUNTER, "Athlete synchronizations of the scheduled sync, by status.", None),
+    "contest_sync_activities_total": (
+        COUNTER, "Activities fetched from Strava by the scheduled sync, and inserted or updated.", None),
+    "contest_strava_api_calls_total": (COUNTER, "HTTP requests sent to the Strava API.", None),
+    "contest_strava_api_errors_total": (
+        COUNTER, "Strava API requests failed, by HTTP status code ('error': no response).", None),
+    "contest_compute_duration_seconds": (HISTOGRAM, "Duration of the points computations, by mode.", JOB_BUCKETS),
+    "contest_points_rows_written_total": (COUNTER, "Weekly points rows inserted, updated or deleted.", None),
+    "contest_http_request_duration_seconds": (
+        HISTOGRAM, "Latency of the api and views requests, by endpoint.", REQUEST_BUCKETS),
+    "contest_last_success_timestamp_seconds": (GAUGE, "Unix time of the last successful run, by job.", None),
+}
+
+# Blueprints whose requests are timed
+TIMED_BLUEPRINTS = ("api", "views")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsRegistry:
+    """
+    Values of the METRICS of this process, by (name, labels). With {directory}, a snapshot
+    is written there every {flush_interval} seconds by a background thread, for the other
+    processes (see collect).
+    """
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._values = {}
+        self._pid = os.getpid()
+        self._changed = False
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        """Add {amount} to the counter {name}."""
+        with self._lock:
+            key = self._key(name, labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Set the gauge {name} to {value}."""
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Count {value} in the histogram {name}."""
+        buckets = METRICS[name][2]
+        with self._lock:
+            key = self._key(name, labels)
+            # Count per bucket (the last one is +Inf), then the sum
+            series = self._values.setdefault(key, [0] * (len(buckets) + 1) + [0.0])
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def _key(self, name, labels):
+        # Called with the lock held
+        if os.getpid() != self._pid:
+            # Forked (e.g. gunicorn --preload): the values so far are the parent's
+            self._pid, self._values, self._flusher = os.getpid(), {}, None
+        if self.directory and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+        self._changed = True
+        return name, tuple(sorted(labels.items()))
+
+    def _snapshot(self):
+        return {key: list(value) if isinstance(value, list) else value for key, value in self._values.items()}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write the snapshot of this process, if anything was recorded since the last one."""
+        with self._lock:
+            if not self._changed or os.getpid() != self._pid:
+                return
+            snapshot = [[name, labels, value] for (name, labels), value in self._snapshot().items()]
+            path = self._path(self._pid)
+            self._changed = False
+        os.makedirs(self.directory, exist_ok=True)
+        # Written aside then renamed: readers never see a partial file
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(snapshot, file)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """Return the values of all the processes, by (name, labels)."""
+        with self._lock:
+            values = self._snapshot()
+            path = self._path(self._pid) if self.directory else None
+        for other in sorted(glob.glob(os.path.join(self.directory, "*.json"))) if path else ():
+            if other == path:
+                continue
+            try:
+                with open(other, encoding="utf-8") as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot:
+                if name in METRICS:
+                    _merge(values, (name, tuple(tuple(label) for label in labels)), value)
+        return values
+
+
+def _merge(values, key, value):
+    current = values.get(key)
+    if current is None:
+        values[key] = value
+    elif METRICS[key[0]][0] == GAUGE:
+        values[key] = max(current, value)
+    elif isinstance(current, list):
+        values[key] = [a + b for a, b in zip(current, value)]
+    else:
+        values[key] = current + value
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def render(values):
+    """Text exposition of {values} (see MetricsRegistry.collect)."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        series = sorted(
+            ((labels, value) for (metric, labels), value in values.items() if metric == name), key=lambda s: s[0]
+        )
+        for labels, value in series:
+            if kind != HISTOGRAM:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            count = 0
+            for bound, bucket_count in zip((*map(_number, buckets), "+Inf"), value):
+                count += bucket_count
+                lines.append(f"{name}_bucket{_labels((*labels, ('le', bound)))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def get_metrics(app) -> MetricsRegistry:
+    """Return the app-wide metrics registry."""
+    if "metrics" not in app.extensions:
+        app.extensions.setdefault("metrics", MetricsRegistry(
+            directory=app.config["METRICS_DIR"],
+            flush_interval=float(app.config["METRICS_FLUSH_INTERVAL"]),
+        ))
+    return app.extensions["metrics"]
+
+
+def init_metrics(app):
+    """Time the requests of the TIMED_BLUEPRINTS."""
+    registry = get_metrics(app)
+
+    @app.before_request
+    def _start_request_timer():
+        if request.blueprint in TIMED_BLUEPRINTS:
+            g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        if "request_started" in g:
+            registry.observe(
+                "contest_http_request_duration_seconds", time.perf_counter() - g.pop("request_started"),
+                endpoint=request.endpoint, method=request.method, status=str(response.status_code),
+            )
+        return response
+
+
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.route("/metrics")
+def metrics_endpoint():
+    return Response(render(get_metrics(current_app).collect()), content_type=CONTENT_TYPE)
+
+
+# Points rows are counted as they are flushed, and recorded once committed.
+
+def count_points_rows(session, written):
+    """Count {written} points rows in the transaction of {session}, e.g. written by bulk statements."""
+    if written:
+        session.info["points_rows_written"] = session.info.get("points_rows_written", 0) + written
+
+
+@event.listens_for(db.session, "before_flush")
+def _count_points_rows(session, _flush_context, _instances):
+    count_points_rows(session, sum(
+        1 for instance in (*session.new, *session.deleted) if isinstance(instance, Point)
+    ) + sum(1 for instance in session.dirty if isinstance(instance, Point) and session.is_modified(instance)))
+
+
+@event.listens_for(db.session, "after_commit")
+def _record_points_rows(session):
+    written = session.info.pop("points_rows_written", None)
+    if written and has_app_context():
+        get_metrics(current_app).inc("contest_points_rows_written_total", written)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_points_rows(session):
+    session.info.pop("points_rows_written", None)
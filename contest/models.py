@@ -13,6 +13,13 @@ class Athlete(db.Model):  # pylint: disable=too-few-public-methods
     access_token = db.Column(db.String(256))
     refresh_token = db.Column(db.String(256))
     expires_at = db.Column(db.Integer)
+    # Incremental sync watermark: latest activity start seen and last full-window resync
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+    last_full_sync_at = db.Column(db.DateTime, nullable=True)
+    last_sync_at = db.Column(db.DateTime, nullable=True)
+    # Adaptive polling: last sync that found new or changed activities, and next sync due
+    last_change_at = db.Column(db.DateTime, nullable=True)
+    next_sync_at = db.Column(db.DateTime, nullable=True)
     activities = db.relationship('Activity', backref='athlete', lazy='dynamic')
     points = db.relationship('Point', backref='athlete', lazy='dynamic')
 
@@ -31,14 +38,23 @@ class Activity(db.Model):
     total_elevation_gain = db.Column(db.Integer)
     type = db.Column(db.String(20))
     has_map = db.Column(db.Integer, default=0)
-    polyline = db.Column(db.String)
+    # Route geometry (unbounded): only loaded when accessed or undeferred
+    polyline = db.deferred(db.Column(db.String))
     photo_count = db.Column(db.Integer)
 
+    # Activities of an athlete over a period (scoring, activity list); moving_time makes
+    # it covering for the valid activity days
+    __table_args__ = (db.Index('ix_activity_athlete_start', 'athlete_id', 'start_date', 'moving_time'),)
+
     def __repr__(self):
         return f'<Activity {self.name}>'
 
-    def to_dict(self):
-        return {
+    # Fields left out of to_dict unless requested
+    OPTIONAL_FIELDS = ("polyline",)
+
+    def to_dict(self, fields=()):
+        """Serialize the activity; {fields} selects the OPTIONAL_FIELDS to include."""
+        data = {
             "id": self.id,
             "athlete_id": self.athlete_id,
             "name": self.name,
@@ -49,16 +65,125 @@ class Activity(db.Model):
             "total_elevation_gain": self.total_elevation_gain,
             "type": self.type,
             "has_map": self.has_map,
-            "polyline": self.polyline,
             "photo_count": self.photo_count,
         }
+        if "polyline" in fields:
+            data["polyline"] = self.polyline
+        return data
 
 
 class Point(db.Model):
     year = db.Column(db.Integer, primary_key=True)
     week_number = db.Column(db.Integer, primary_key=True)
     athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'), primary_key=True)
+    # Points generation (see PointsGeneration): only the rows of the active one are visible
+    generation = db.Column(db.Integer, primary_key=True, default=0, server_default='0')
+    total_points = db.Column(db.Integer)
+
+    # Week leaderboard (ordered by points), and points of an athlete
+    __table_args__ = (
+        db.Index('ix_point_week_total', 'generation', 'year', 'week_number', 'total_points'),
+        db.Index('ix_point_athlete', 'athlete_id'),
+    )
+
+
+class MonthPoint(db.Model):
+    """Materialized month leaderboard (see leaderboard.refresh_month)."""
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'), primary_key=True)
+    generation = db.Column(db.Integer, primary_key=True, default=0, server_default='0')
     total_points = db.Column(db.Integer)
+    rank = db.Column(db.Integer)
+    athlete = db.relationship('Athlete')
+
+    __table_args__ = (db.Index('ix_month_point_rank', 'generation', 'year', 'month', 'rank'),)
+
+
+class YearPoint(db.Model):
+    """Materialized year leaderboard (see leaderboard.refresh_year)."""
+    year = db.Column(db.Integer, primary_key=True)
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'), primary_key=True)
+    generation = db.Column(db.Integer, primary_key=True, default=0, server_default='0')
+    total_points = db.Column(db.Integer)
+    rank = db.Column(db.Integer)
+    athlete = db.relationship('Athlete')
+
+    __table_args__ = (db.Index('ix_year_point_rank', 'generation', 'year', 'rank'),)
+
+
+# Status of a points generation
+GENERATION_BUILDING = "building"
+GENERATION_ACTIVE = "active"
+GENERATION_RETIRED = "retired"
+GENERATION_FAILED = "failed"
+
+
+class PointsGeneration(db.Model):
+    """
+    Set of Point/MonthPoint/YearPoint rows. A full recompute builds a new generation next to
+    the active one, then activates it in a single transaction (see tasks.compute_full); the
+    retired one is kept for a while so that it can be activated again.
+    Without any row, generation 0 is the active one.
+    """
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(16), nullable=False, index=True)
+    started_at = db.Column(db.DateTime)
+    activated_at = db.Column(db.DateTime)
+    retired_at = db.Column(db.DateTime)
+
+
+class Counter(db.Model):
+    """Named counter shared by all the processes (e.g. the leaderboard version)."""
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Lease(db.Model):
+    """Lease held by one process at a time, e.g. the scheduler's (see lease.py)."""
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    # Start of the last run of the job guarded by the lease (see DatabaseLease.claim_run)
+    last_run_at = db.Column(db.DateTime)
+
+
+class JobReport(db.Model):
+    """Summary (JSON) of the last run of a job, e.g. the Strava sync, for every process to read."""
+    name = db.Column(db.String(64), primary_key=True)
+    finished_at = db.Column(db.DateTime, nullable=False)
+    summary = db.Column(db.Text, nullable=False)
+
+
+class DirtyWeek(db.Model):
+    """(athlete, ISO week) bucket whose points must be recomputed."""
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    week_number = db.Column(db.Integer, primary_key=True)
+    marked_at = db.Column(db.DateTime, nullable=False)
+
+
+class OnboardingJob(db.Model):
+    """Progress of the first import of an athlete's activities (see onboarding.py)."""
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'), primary_key=True)
+    status = db.Column(db.String(16), nullable=False)
+    activities = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    queued_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "activities": self.activities,
+            "points": self.points,
+            "queued_at": self.queued_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
 
 
 class User(UserMixin, db.Model):
@@ -0,0 +1,93 @@
+import queue
+import threading
+from datetime import timedelta
+from flask import current_app
+from .extensions import db
+from .generations import active_points_generation
+from .models import Athlete, OnboardingJob, Point
+from .tasks import compute_athlete_points, serialized_writes, sync_athlete, utcnow
+
+# The first import of a newly linked athlete (possibly years of activities) runs in a
+# background worker, its progress being stored in OnboardingJob. The queue is in-memory:
+# a job lost on restart is caught up by the periodic polling sync (never-synchronized
+# athletes come first), and the athlete can re-link to restart it.
+ONBOARDING_QUEUED = "queued"
+ONBOARDING_RUNNING = "running"
+ONBOARDING_DONE = "done"
+ONBOARDING_FAILED = "failed"
+# A job still queued or running after that long was lost (e.g. restart) and can be restarted
+ONBOARDING_TIMEOUT = timedelta(hours=1)
+
+_jobs = queue.Queue()
+_worker_lock = threading.Lock()
+
+
+def start_onboarding(app, athlete_id):
+    """
+    Queue the first import of {athlete_id}. Idempotent: nothing is queued while a job of
+    the athlete is already queued or running (e.g. the user re-linked their account),
+    unless it timed out (see ONBOARDING_TIMEOUT). Return the OnboardingJob.
+    """
+    with serialized_writes():
+        job = db.session.get(OnboardingJob, athlete_id)
+        if job is not None and job.status in (ONBOARDING_QUEUED, ONBOARDING_RUNNING) \
+                and utcnow() - job.queued_at < ONBOARDING_TIMEOUT:
+            return job
+        if job is None:
+            job = OnboardingJob(athlete_id=athlete_id)
+            db.session.add(job)
+        job.status = ONBOARDING_QUEUED
+        job.activities = job.points = 0
+        job.queued_at = utcnow()
+        job.started_at = job.finished_at = job.error = None
+        db.session.commit()
+
+    if app.config["STRAVA_ONBOARDING_ASYNC"]:
+        _jobs.put(athlete_id)
+        with _worker_lock:
+            worker = app.extensions.get("strava_onboarding_worker")
+            if worker is None or not worker.is_alive():
+                worker = threading.Thread(
+                    target=_process_jobs, args=(app,), name="strava-onboarding", daemon=True
+                )
+                app.extensions["strava_onboarding_worker"] = worker
+                worker.start()
+    else:
+        run_onboarding(athlete_id)
+    return job
+
+
+def _process_jobs(app):
+    while True:
+        athlete_id = _jobs.get()
+        with app.app_context():
+            run_onboarding(athlete_id)
+        _jobs.task_done()
+
+
+def _update_job(job, **values):
+    with serialized_writes():
+        for key, value in values.items():
+            setattr(job, key, value)
+        db.session.commit()
+
+
+def run_onboarding(athlete_id):
+    """Import all the activities of an athlete and compute their points, recording progress."""
+    job = db.session.get(OnboardingJob, athlete_id)
+    athlete = db.session.get(Athlete, athlete_id)
+    if job is None or athlete is None:
+        return
+    _update_job(job, status=ONBOARDING_RUNNING, started_at=utcnow())
+    try:
+        sync_athlete(athlete, full=True, on_page=lambda stats: _update_job(job, activities=stats["fetched"]))
+        with serialized_writes():
+            compute_athlete_points(athlete)
+        points = db.session.query(db.func.sum(Point.total_points)).filter_by(
+            athlete_id=athlete_id, generation=active_points_generation()
+        ).scalar()
+        _update_job(job, status=ONBOARDING_DONE, points=points or 0, finished_at=utcnow())
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        db.session.rollback()
+        current_app.logger.exception('Onboarding of athlete %d failed', athlete_id)
+        _update_job(job, status=ONBOARDING_FAILED, error=str(e)[:255], finished_at=utcnow())
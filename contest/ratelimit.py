@@ -0,0 +1,99 @@
+import threading
+from datetime import datetime, UTC
+from stravalib.util.limiter import RateLimiter, get_rates_from_response_headers
+
+
+class RateBudget(RateLimiter):
+    """
+    Token-bucket view of the Strava API quota, shared by all the Strava clients of the app.
+
+    Strava enforces a 15-minute and a daily quota, reset at every quarter of an hour and at
+    midnight UTC: both buckets are refilled at these boundaries. Calls are taken from the
+    buckets before being issued (see try_acquire), and the buckets are corrected with the
+    actual usage reported in the rate-limit headers of every Strava response.
+    Each process has its own: the headers keep them in line with the usage of all of them.
+    """
+
+    def __init__(self, short_limit: int, long_limit: int, reserve: int = 0):
+        super().__init__()
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        # Calls kept aside for interactive use (onboarding, push events)
+        self.reserve = reserve
+        self.short_usage = 0
+        self.long_usage = 0
+        self._lock = threading.Lock()
+        self._windows = self._current_windows(datetime.now(UTC))
+
+    @staticmethod
+    def _current_windows(now):
+        return (now.date(), now.hour, now.minute // 15)
+
+    def _refill(self):
+        """Refill the buckets whose window ended (caller holds the lock)."""
+        windows = self._current_windows(datetime.now(UTC))
+        if windows[0] != self._windows[0]:
+            self.long_usage = 0
+        if windows != self._windows:
+            self.short_usage = 0
+        self._windows = windows
+
+    def __call__(self, args: dict[str, str], method) -> None:
+        """Called by stravalib with the headers of every response."""
+        rates = get_rates_from_response_headers(args, method)
+        if rates is None:
+            return
+        with self._lock:
+            self._refill()
+            self.short_limit, self.long_limit = rates.short_limit, rates.long_limit
+            self.short_usage, self.long_usage = rates.short_usage, rates.long_usage
+
+    def remaining(self) -> int:
+        """Number of calls that can still be issued in the current windows."""
+        with self._lock:
+            self._refill()
+            return self._remaining()
+
+    def _remaining(self):
+        return max(0, min(
+            self.short_limit - self.short_usage,
+            self.long_limit - self.long_usage,
+        ) - self.reserve)
+
+    def try_acquire(self, calls: int) -> bool:
+        """Take {calls} tokens from the buckets if they are all available."""
+        with self._lock:
+            self._refill()
+            if calls > self._remaining():
+                return False
+            self.short_usage += calls
+            self.long_usage += calls
+            return True
+
+    def exhaust(self):
+        """Strava answered 429: nothing left until the end of the 15-minute window."""
+        with self._lock:
+            self.short_usage = self.short_limit
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {
+                "short_limit": self.short_limit,
+                "short_usage": self.short_usage,
+                "long_limit": self.long_limit,
+                "long_usage": self.long_usage,
+                "reserve": self.reserve,
+                "remaining": self._remaining(),
+            }
+
+
+def get_rate_budget(app) -> RateBudget:
+    """Return the app-wide Strava API budget."""
+    if "strava_rate_budget" not in app.extensions:
+        app.extensions.setdefault("strava_rate_budget", RateBudget(
+            short_limit=int(app.config["STRAVA_RATE_LIMIT_SHORT"]),
+            long_limit=int(app.config["STRAVA_RATE_LIMIT_LONG"]),
+            reserve=int(app.config["STRAVA_RATE_LIMIT_RESERVE"]),
+        ))
+    return app.extensions["strava_rate_budget"]
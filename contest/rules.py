@@ -1,7 +1,9 @@
 import time
 from abc import ABC, abstractmethod
-from datetime import date, datetime, timedelta
+from collections import defaultdict
+from datetime import date, datetime, timedelta, time as dt_time
 from flask import current_app
+from .extensions import db
 from .models import Athlete, Activity
 
 def week_boundaries(year: int, week: int):
@@ -11,6 +13,20 @@ def week_boundaries(year: int, week: int):
         'last_sunday': date.fromisocalendar(year, week, 7)
     }
 
+def week_timestamps(year: int, week: int):
+    """Return the (start, end) timestamps of an ISO week: Monday 00:00 to Sunday 23:59:59."""
+    week_range = week_boundaries(year, week)
+    return (
+        time.mktime(week_range['first_monday'].timetuple()),
+        time.mktime(datetime.combine(week_range['last_sunday'], dt_time.max).timetuple()),
+    )
+
+def previous_week(year: int, week: int):
+    """Return the (year, week) preceding an ISO week (handle year change)."""
+    if week == 1:
+        return year - 1, date(year - 1, 12, 28).isocalendar()[1]
+    return year, week - 1
+
 def get_valid_activities(start_timestamp, end_timestamp, athlete_id):
     """Return all valid activities for an athlete in a period."""
     min_time = current_app.config['MINIMUM_ACTIVITY_TIME']
@@ -21,6 +37,38 @@ def get_valid_activities(start_timestamp, end_timestamp, athlete_id):
         Activity.moving_time >= min_time
     ).all()
 
+def valid_activity_days(athlete_id=None, weeks=None) -> dict:
+    """
+    Return {(athlete_id, year, week): number of distinct days with a valid activity},
+    for all athletes or a single one, from a single query. Only the given (year, week)
+    {weeks} are looked at, if any.
+    """
+    day = db.func.date(Activity.start_date)
+    query = db.session.query(Activity.athlete_id, day).filter(
+        Activity.moving_time >= current_app.config['MINIMUM_ACTIVITY_TIME']
+    )
+    if athlete_id is not None:
+        query = query.filter(Activity.athlete_id == athlete_id)
+    if weeks is not None:
+        mondays = [datetime.fromisocalendar(year, week, 1) for year, week in set(weeks)]
+        query = query.filter(db.or_(False, *(
+            (Activity.start_date >= monday) & (Activity.start_date < monday + timedelta(weeks=1))
+            for monday in mondays
+        )))
+    weeks = defaultdict(int)
+    for activity_athlete_id, activity_day in query.distinct():
+        if isinstance(activity_day, str):
+            activity_day = date.fromisoformat(activity_day)
+        weeks[(activity_athlete_id, *activity_day.isocalendar()[:2])] += 1
+    return weeks
+
+def active_weeks(athlete_id, weeks=None) -> set:
+    """
+    Return the set of (year, week) in which the athlete has at least one valid activity,
+    among the given {weeks} if any.
+    """
+    return {(year, week) for _, year, week in valid_activity_days(athlete_id, weeks)}
+
 def unique_activity_days(activities):
     """Return a set of unique days (date objects) with at least one activity."""
     return set(a.start_date.date() for a in activities)
@@ -31,6 +79,14 @@ class Rule(ABC):
     def calculate_points(self, athlete: Athlete, activities: list) -> int:
         """Calculate the number of points for the athlete."""
 
+    @abstractmethod
+    def grouped_points(self, activity_days: int, previous_week_active: bool) -> int:
+        """
+        Calculate the points of a week from its aggregates (used by SetContestEngine):
+        the number of distinct days with a valid activity, and whether the previous
+        week had a valid activity.
+        """
+
 class Standard(Rule):
     """1 point per activity (minimum duration, max one per day)."""
     def __init__(self, points_per_activity: int):
@@ -40,33 +96,39 @@ class Standard(Rule):
         days = unique_activity_days(activities)
         return len(days) * self.points_per_activity
 
+    def grouped_points(self, activity_days: int, previous_week_active: bool) -> int:
+        return activity_days * self.points_per_activity
+
 class RegularityBonusA(Rule):
-    """Bonus if at least one activity this week and at least one last week."""
-    def __init__(self, bonus_points: int, week_number: int, year: int):
+    """
+    Bonus if at least one activity this week and at least one last week.
+    Last week is looked up in {weeks_with_activities} (see active_weeks) when given,
+    instead of querying its activities.
+    """
+    def __init__(self, bonus_points: int, week_number: int, year: int, weeks_with_activities: set = None):
         self.bonus_points = bonus_points
         self.week_number = week_number
         self.year = year
+        self.weeks_with_activities = weeks_with_activities
 
     def calculate_points(self, athlete: Athlete, activities: list) -> int:
         if not activities:
             return 0
-        # Calculate last week (handle year change)
-        if self.week_number == 1:
-            prev_year = self.year - 1
-            prev_week = date(prev_year, 12, 28).isocalendar()[1]
-        else:
-            prev_year = self.year
-            prev_week = self.week_number - 1
-        last_week_range = week_boundaries(prev_year, prev_week)
+        if self.weeks_with_activities is not None:
+            if previous_week(self.year, self.week_number) in self.weeks_with_activities:
+                return self.bonus_points
+            return 0
         last_week_activities = get_valid_activities(
-            time.mktime(last_week_range['first_monday'].timetuple()),
-            time.mktime(last_week_range['last_sunday'].timetuple()),
+            *week_timestamps(*previous_week(self.year, self.week_number)),
             athlete.id
         )
         if last_week_activities:
             return self.bonus_points
         return 0
 
+    def grouped_points(self, activity_days: int, previous_week_active: bool) -> int:
+        return self.bonus_points if activity_days and previous_week_active else 0
+
 class RegularityBonusB(Rule):
     """Bonus for at least 4 unique activity days in the week."""
     def __init__(self, bonus_points: int):
@@ -76,6 +138,9 @@ class RegularityBonusB(Rule):
         days = unique_activity_days(activities)
         return self.bonus_points if len(days) >= 4 else 0
 
+    def grouped_points(self, activity_days: int, previous_week_active: bool) -> int:
+        return self.bonus_points if activity_days >= 4 else 0
+
 class ContestEngine:
     """Main ContestEngine to compute points/rules"""
     def __init__(self, rules: list[Rule], year: int):
@@ -106,22 +171,42 @@ class ContestEngine:
         current_year, current_week = today.isocalendar()[:2]
 
         weeks_to_compute = self._weeks_to_compute(current_year, current_week)
+        weeks_with_activities = None
+        if any(isinstance(rule, RegularityBonusA) for rule in self.rules):
+            weeks_with_activities = active_weeks(athlete.id)
 
         for year, week in weeks_to_compute:
-            week_range = week_boundaries(year, week)
-            activities = get_valid_activities(
-                time.mktime(week_range['first_monday'].timetuple()),
-                time.mktime(week_range['last_sunday'].timetuple()),
-                athlete.id
-            )
+            activities = get_valid_activities(*week_timestamps(year, week), athlete.id)
             points = 0
             for rule in self.rules:
                 if isinstance(rule, RegularityBonusA):
-                    points += RegularityBonusA(rule.bonus_points, week, year).calculate_points(
-                        athlete, activities
-                    )
+                    points += RegularityBonusA(
+                        rule.bonus_points, week, year, weeks_with_activities
+                    ).calculate_points(athlete, activities)
                 else:
                     points += rule.calculate_points(athlete, activities)
             results[(year, week)] = points
 
         return results
+
+
+class SetContestEngine:
+    """
+    Set-based alternative to ContestEngine: scores every athlete at once.
+    A single query returns the distinct (athlete, day) pairs with a valid activity; they are
+    grouped by (athlete, ISO week) and each rule is evaluated on the group aggregates
+    (see Rule.grouped_points) instead of per athlete and per week over ORM objects.
+    """
+    def __init__(self, rules: list[Rule]):
+        self.rules = rules
+
+    def calculate_points(self) -> dict:
+        """Return {(athlete_id, year, week): points} for every week with points."""
+        weeks = valid_activity_days()
+        results = {}
+        for (athlete_id, year, week), activity_days in weeks.items():
+            previous_week_active = (athlete_id, *previous_week(year, week)) in weeks
+            points = sum(rule.grouped_points(activity_days, previous_week_active) for rule in self.rules)
+            if points:
+                results[(athlete_id, year, week)] = points
+        return results
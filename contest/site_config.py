@@ -0,0 +1,82 @@
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from .counters import bump_counter, counter_value
+from .extensions import db
+from .models import SiteConfig
+
+# Counter bumped by every transaction changing SiteConfig rows: the other processes
+# reload their cache when they see a new version
+SITE_CONFIG_VERSION = "site_config_version"
+
+
+class SiteConfigCache:
+    """
+    All the SiteConfig key/values, loaded at once. The version counter is checked at most
+    every {check_interval} seconds, and the keys reloaded only when it changed.
+    """
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def values(self) -> dict:
+        """Return the {key: value} of the SiteConfig rows (shared: don't modify it)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._values is not None and now - self._checked_at < self.check_interval:
+                return self._values
+            version = counter_value(SITE_CONFIG_VERSION)
+            if self._values is None or version != self._version:
+                self._values = dict(db.session.execute(db.select(SiteConfig.key, SiteConfig.value)).all())
+                self._version = version
+            self._checked_at = now
+            return self._values
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+
+def get_site_config_cache(app) -> SiteConfigCache:
+    """Return the app-wide SiteConfig cache."""
+    if "site_config_cache" not in app.extensions:
+        app.extensions.setdefault("site_config_cache", SiteConfigCache(float(app.config["SITE_CONFIG_CHECK_INTERVAL"])))
+    return app.extensions["site_config_cache"]
+
+
+def site_config() -> dict:
+    """Return the cached {key: value} of the SiteConfig rows (don't modify it)."""
+    return get_site_config_cache(current_app).values()
+
+
+# Writes to SiteConfig bump the version within their transaction, and drop the cache of
+# this process once committed.
+
+@event.listens_for(db.session, "before_flush")
+def _collect_site_config_changes(session, _flush_context, _instances):
+    if any(isinstance(instance, SiteConfig) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info["site_config_changed"] = True
+
+
+@event.listens_for(db.session, "before_commit")
+def _bump_site_config_version(session):
+    session.flush()
+    if session.info.get("site_config_changed"):
+        bump_counter(SITE_CONFIG_VERSION)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_site_config(session):
+    if session.info.pop("site_config_changed", None) and has_app_context():
+        cache = current_app.extensions.get("site_config_cache")
+        if cache is not None:
+            cache.invalidate()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_site_config_changes(session):
+    session.info.pop("site_config_changed", None)
@@ -0,0 +1,43 @@
+from functools import partial
+from sqlalchemy import create_engine, event
+from .extensions import READ_ENGINE, db
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMA statements run on every new connection, from the SQLITE_* settings."""
+    pragmas = [
+        ("busy_timeout", int(config["SQLITE_BUSY_TIMEOUT"])),
+        ("synchronous", config["SQLITE_SYNCHRONOUS"]),
+        ("cache_size", -int(config["SQLITE_CACHE_SIZE"])),
+        ("mmap_size", int(config["SQLITE_MMAP_SIZE"])),
+    ]
+    if read_only:
+        return pragmas + [("query_only", "ON")]
+    # Persistent in the database file: set by the writers only
+    return [("journal_mode", config["SQLITE_JOURNAL_MODE"])] + pragmas
+
+
+def _set_pragmas(pragmas, dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def init_database(app):
+    """
+    Initialize db for {app}. With SQLITE_READ_ENGINE, reads wrapped in read_only() get their
+    own engine (pool of query-only connections) on the same database file, so that they are
+    never queued behind the background jobs' writes.
+    """
+    db.init_app(app)
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not uri.startswith("sqlite"):
+        return
+    with app.app_context():
+        event.listen(db.engine, "connect", partial(_set_pragmas, sqlite_pragmas(app.config)))
+        in_memory = db.engine.url.database in (None, "", ":memory:")
+    if app.config["SQLITE_READ_ENGINE"] and not in_memory:
+        engine = create_engine(uri, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        event.listen(engine, "connect", partial(_set_pragmas, sqlite_pragmas(app.config, read_only=True)))
+        app.extensions[READ_ENGINE] = engine
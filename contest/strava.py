@@ -3,7 +3,8 @@ from flask_login import login_required, current_user
 from stravalib import Client
 from .extensions import db
 from .models import Athlete
-from .tasks import sync_athlete, compute_athlete_points
+from .onboarding import start_onboarding
+from .strava_http import get_strava_session
 
 strava = Blueprint("strava", __name__)
 
@@ -29,7 +30,7 @@ def callback():
         flash(f'Error: {error}')
     else:
         code = request.args.get("code")
-        client = Client()
+        client = Client(requests_session=get_strava_session(current_app))
         # Exchange the authorization code for an access token
         access_token = client.exchange_code_for_token(
             client_id=current_app.config["STRAVA_CLIENT_ID"],
@@ -60,11 +61,11 @@ def callback():
         # Associate athlete with current user
         current_user.athlete_id = strava_athlete.id
         db.session.commit()
-        # Synchronize the athlete's data
-        sync_athlete(new_athlete)
-        compute_athlete_points(new_athlete)
+        # Import the athlete's activities and compute their points in the background
+        # (progress on the profile page)
+        start_onboarding(current_app._get_current_object(), strava_athlete.id)  # pylint: disable=protected-access
         # Flash a success message
-        flash('Strava account linked successfully!')
+        flash('Strava account linked successfully! Your activities are being imported.')
 
     # Render the index page after processing the callback
     return render_template("index.html")
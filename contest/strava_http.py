@@ -0,0 +1,63 @@
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import get_metrics
+
+
+class StravaHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a default (connect, read) {timeout} (stravalib sets none). With
+    {origin} (e.g. http://127.0.0.1:8081), every request is sent to that server instead,
+    keeping the path (local fake Strava server). Calls and errors are counted in {metrics}
+    (a metrics.MetricsRegistry), if given.
+    """
+    def __init__(self, timeout, origin=None, metrics=None, **kwargs):
+        self.timeout = timeout
+        self.origin = urlsplit(origin) if origin else None
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        if self.origin:
+            url = urlsplit(request.url)
+            request.url = urlunsplit((self.origin.scheme, self.origin.netloc, url.path, url.query, url.fragment))
+        if self.metrics is None:
+            return super().send(request, *args, **kwargs)
+        self.metrics.inc("contest_strava_api_calls_total")
+        try:
+            response = super().send(request, *args, **kwargs)
+        except requests.RequestException:
+            self.metrics.inc("contest_strava_api_errors_total", code="error")
+            raise
+        if response.status_code >= 400:
+            self.metrics.inc("contest_strava_api_errors_total", code=str(response.status_code))
+        return response
+
+
+def build_strava_session(pool_size, timeout, origin=None, metrics=None) -> requests.Session:
+    """
+    Return a requests session keeping up to {pool_size} connections alive to Strava, to
+    share between the per-athlete clients (stravalib passes the access token as a request
+    parameter, and cookies are refused: the session holds no per-athlete state).
+    """
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = StravaHTTPAdapter(timeout, origin, metrics, pool_connections=2, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_strava_session(app) -> requests.Session:
+    """Return the app-wide pooled HTTP session for the Strava API."""
+    if "strava_http_session" not in app.extensions:
+        app.extensions.setdefault("strava_http_session", build_strava_session(
+            pool_size=int(app.config["STRAVA_HTTP_POOL_SIZE"]),
+            timeout=(float(app.config["STRAVA_HTTP_CONNECT_TIMEOUT"]), float(app.config["STRAVA_HTTP_READ_TIMEOUT"])),
+            origin=app.config["STRAVA_API_ORIGIN"],
+            metrics=get_metrics(app),
+        ))
+    return app.extensions["strava_http_session"]
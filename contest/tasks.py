@@ -1,143 +1,709 @@
-from datetime import datetime
+import json
+import queue
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta, UTC
+from itertools import islice
+import click
 import dateutil.relativedelta
 from flask import current_app
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from stravalib import Client
+from stravalib.client import BatchedResultsIterator
+from stravalib.exc import RateLimitExceeded
 from .extensions import db
-from .rules import ContestEngine, Standard, RegularityBonusA, RegularityBonusB
-from .models import Athlete, Activity, Point
+from .generations import (
+    activate_generation, fail_generation, previous_generation, purge_generations, start_generation,
+    writable_generations,
+)
+from .leaderboard import rebuild_leaderboards
+from .metrics import count_points_rows, get_metrics
+from .ratelimit import get_rate_budget
+from .rules import Standard, RegularityBonusA, RegularityBonusB, active_weeks, previous_week
+from .strava_http import get_strava_session
+from .models import Athlete, Activity, DirtyWeek, JobReport, Point
 
-def sync_athlete(athlete):
-    """Synchronize a single athlete's details and activities from Strava."""
+# SQLite only allows a single writer: sync workers share this lock around commits
+_write_lock = threading.Lock()
 
-    today = datetime.today()
+
+@contextmanager
+def serialized_writes():
+    """Serialize database writes between concurrent sync workers."""
+    with _write_lock:
+        yield
+
+
+# Outcome of an athlete synchronization within a batch
+SYNC_SUCCEEDED = "succeeded"
+SYNC_FAILED = "failed"
+SYNC_DEFERRED = "deferred"
+
+# JobReport of the last Strava sync
+STRAVA_SYNC_REPORT = "strava_sync"
+
+# Columns refreshed when an already known activity is synchronized again
+ACTIVITY_UPDATE_FIELDS = (
+    "name", "distance", "moving_time", "elapsed_time", "start_date",
+    "total_elevation_gain", "type", "photo_count",
+)
+
+
+def activity_values(athlete_id, activity_item):
+    """Map a Strava activity onto the columns of the Activity table."""
+    start_date = activity_item.start_date
+    if start_date is not None and start_date.tzinfo is not None:
+        # Columns are naive (UTC wall time): keep stored and fetched values comparable
+        start_date = start_date.replace(tzinfo=None)
+    return {
+        "id": activity_item.id,
+        "athlete_id": athlete_id,
+        "name": activity_item.name,
+        "distance": activity_item.distance,
+        "moving_time": activity_item.moving_time,
+        "elapsed_time": activity_item.elapsed_time,
+        "start_date": start_date,
+        "total_elevation_gain": activity_item.total_elevation_gain,
+        "type": activity_item.type.root,
+        "photo_count": activity_item.photo_count,
+        "has_map": 1 if activity_item.map else 0,
+        "polyline": activity_item.map.polyline if activity_item.map else None,
+    }
+
+
+def upsert_activities(athlete_id, activity_items):
+    """
+    Write a page of Strava activities as one batch: a single SELECT of the known rows,
+    one bulk INSERT for new activities, one bulk UPDATE for changed ones and one commit.
+    Unchanged activities are not written at all. The weeks of the written activities are
+    flagged for a points recompute. Return (inserted, updated).
+    """
+    rows = {item.id: activity_values(athlete_id, item) for item in activity_items}
+    # Known rows read within the lock: another worker may be writing the same activities
+    # (e.g. a push event during the scheduled sync)
+    with serialized_writes():
+        existing = {
+            row.id: row for row in db.session.execute(
+                select(Activity.id, *(getattr(Activity, field) for field in ACTIVITY_UPDATE_FIELDS))
+                .where(Activity.id.in_(rows))
+            )
+        }
+        inserts = [values for activity_id, values in rows.items() if activity_id not in existing]
+        updates = [
+            {"id": activity_id, **{field: values[field] for field in ACTIVITY_UPDATE_FIELDS}}
+            for activity_id, values in rows.items()
+            if activity_id in existing and any(
+                getattr(existing[activity_id], field) != values[field] for field in ACTIVITY_UPDATE_FIELDS
+            )
+        ]
+        if not inserts and not updates:
+            return 0, 0
+        if inserts:
+            # An upsert all the same: the lock doesn't cover the other processes
+            statement = sqlite_insert(Activity)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=[Activity.id],
+                set_={field: statement.excluded[field] for field in ACTIVITY_UPDATE_FIELDS},
+            ), inserts)
+        if updates:
+            db.session.execute(update(Activity), updates)
+        # Points of both the old and the new week of a moved activity change
+        mark_weeks_dirty(athlete_id, [values["start_date"] for values in inserts + updates] + [
+            existing[values["id"]].start_date for values in updates
+        ])
+        db.session.commit()
+    return len(inserts), len(updates)
+
+
+def utcnow():
+    """Naive UTC now, comparable with the naive DateTime columns."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _sync_window_start(athlete, now, full):
+    """
+    Return (after, deep) for the activities to fetch. A deep resync fetches the whole
+    STRAVA_REFRESH_INTERVAL window (and catches edits on older activities); otherwise
+    only activities started after the athlete's watermark (minus an overlap) are fetched.
+    """
+    window_start = now - dateutil.relativedelta.relativedelta(
+        months=int(current_app.config["STRAVA_REFRESH_INTERVAL"])
+    )
+    deep = (
+        full
+        or athlete.last_activity_at is None
+        or athlete.last_full_sync_at is None
+        or now - athlete.last_full_sync_at >= timedelta(hours=int(current_app.config["STRAVA_FULL_SYNC_INTERVAL"]))
+    )
+    if deep:
+        return window_start, True
+    overlap = timedelta(hours=int(current_app.config["STRAVA_SYNC_OVERLAP"]))
+    return max(window_start, athlete.last_activity_at - overlap), False
+
+
+def strava_client(athlete):
+    """Return a Strava client authenticated as {athlete}."""
     client = Client(
         access_token=athlete.access_token,
         refresh_token=athlete.refresh_token,
+        rate_limiter=get_rate_budget(current_app),
+        requests_session=get_strava_session(current_app),
     )
-    client.client_id = current_app.config["STRAVA_CLIENT_ID"]
-    client.client_secret = current_app.config["STRAVA_CLIENT_SECRET"]
+    # stravalib refreshes expired tokens with the credentials of its protocol object only
+    client.protocol.client_id = current_app.config["STRAVA_CLIENT_ID"]
+    client.protocol.client_secret = current_app.config["STRAVA_CLIENT_SECRET"]
     client.token_expires = athlete.expires_at
+    return client
+
 
-    # Refresh athlete details
+def refresh_athlete_details(client, athlete):
+    """Refresh athlete details from Strava, and store the tokens if they were refreshed."""
     current_app.logger.info('Refreshing athlete details from Strava API')
     athlete_detail = client.get_athlete()
-    Athlete.query.filter_by(id=athlete_detail.id).update({
-        "firstname": athlete_detail.firstname,
-        "lastname": athlete_detail.lastname,
-        "country": athlete_detail.country
-    })
-    db.session.commit()
+    with serialized_writes():
+        Athlete.query.filter_by(id=athlete_detail.id).update({
+            "firstname": athlete_detail.firstname,
+            "lastname": athlete_detail.lastname,
+            "country": athlete_detail.country
+        })
+        db.session.commit()
+    store_refreshed_token(client, athlete)
 
-    # If the token was refreshed, update the DB
+
+def store_refreshed_token(client, athlete):
+    """If the client refreshed the athlete's token, update the DB."""
     if client.access_token != athlete.access_token:
-        athlete.access_token = client.access_token
-        athlete.refresh_token = client.refresh_token
-        athlete.expires_at = getattr(client, "token_expires_at", athlete.expires_at)
-        db.session.commit()
+        with serialized_writes():
+            athlete.access_token = client.access_token
+            athlete.refresh_token = client.refresh_token
+            athlete.expires_at = client.token_expires or athlete.expires_at
+            db.session.commit()
+
+
+_PAGES_DONE = object()
+
+
+def prefetch_pages(items, batch_size, depth):
+    """
+    Iterate over {items} in lists of {batch_size}, fetched ahead by a background thread
+    into a queue of at most {depth} pages: the caller's DB writes overlap with the next
+    HTTP requests, and the fetcher blocks when the writer lags behind. Errors of the
+    fetcher are raised here; the fetcher stops when the iteration is left early.
+    """
+    pages = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def fetch():
+        try:
+            iterator = iter(items)
+            while not stop.is_set() and (page := list(islice(iterator, batch_size))):
+                put(page)
+                if len(page) < batch_size:
+                    # Exhausted: stravalib's result iterators start over from page 1 if asked again
+                    break
+            put(_PAGES_DONE)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            put(e)
+
+    fetcher = threading.Thread(target=fetch, name="strava-prefetch", daemon=True)
+    fetcher.start()
+    try:
+        while (page := pages.get()) is not _PAGES_DONE:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        fetcher.join()
+
+
+def sync_athlete(athlete, full=False, on_page=None, scheduled_at=None):
+    """
+    Synchronize a single athlete's details and activities from Strava.
+    Only activities after the athlete's sync watermark are fetched, unless a deep resync
+    is due (see STRAVA_FULL_SYNC_INTERVAL) or forced with {full}.
+    {on_page} is called with the running stats after each page of activities is stored.
+    The next sync is due sync_interval after {scheduled_at}, the start of the scheduled
+    sync running this one (defaults to now).
+    """
+
+    now = utcnow()
+    client = strava_client(athlete)
+    refresh_athlete_details(client, athlete)
 
     # Refresh athlete activities
     current_app.logger.info(
         'Refreshing activities for %s (%d)', athlete.firstname, athlete.id
     )
-    activities = client.get_activities(
-        after=(
-            today - dateutil.relativedelta.relativedelta(
-                months=current_app.config["STRAVA_REFRESH_INTERVAL"]
-            )
-        )
-    )
-    for activity_item in activities:
-        activity_record = Activity.query.filter_by(id=activity_item.id)
-        if not activity_record.first():
-            # Insert activity
-            activity_record = Activity(
-                id=activity_item.id,
-                athlete_id=athlete.id,
-                name=activity_item.name,
-                distance=activity_item.distance,
-                moving_time=activity_item.moving_time,
-                elapsed_time=activity_item.elapsed_time,
-                start_date=activity_item.start_date,
-                total_elevation_gain=activity_item.total_elevation_gain,
-                type=activity_item.type.root,
-                photo_count=activity_item.photo_count,
-                has_map=1 if activity_item.map else 0,
-                polyline=activity_item.map.polyline if activity_item.map else None,
-            )
-            db.session.add(activity_record)
-        else:
-            # Update activity
-            activity_record.update({
-                "name": activity_item.name,
-                "distance": activity_item.distance,
-                "moving_time": activity_item.moving_time,
-                "elapsed_time": activity_item.elapsed_time,
-                "start_date": activity_item.start_date,
-                "total_elevation_gain": activity_item.total_elevation_gain,
-                "type": activity_item.type.root,
-                "photo_count": activity_item.photo_count
-            })
+    after, deep = _sync_window_start(athlete, now, full)
+    stats = {"fetched": 0, "inserted": 0, "updated": 0}
+    last_activity_at = athlete.last_activity_at
+    # Closed on the way out, errors included: the fetcher thread is stopped right away
+    with closing(prefetch_pages(
+        client.get_activities(after=after),
+        int(current_app.config["STRAVA_SYNC_BATCH_SIZE"]),
+        int(current_app.config["STRAVA_SYNC_PREFETCH"]),
+    )) as pages:
+        for page in pages:
+            page_inserted, page_updated = upsert_activities(athlete.id, page)
+            stats["fetched"] += len(page)
+            stats["inserted"] += page_inserted
+            stats["updated"] += page_updated
+            if on_page:
+                on_page(stats)
+            last_activity_at = max(filter(None, [
+                last_activity_at, *(activity_values(athlete.id, item)["start_date"] for item in page)
+            ]), default=None)
+
+    # Move the watermark forward, and schedule the next sync
+    recent_activities = db.session.query(func.count(Activity.id)).filter(
+        Activity.athlete_id == athlete.id,
+        Activity.start_date >= now - timedelta(days=int(current_app.config["STRAVA_CADENCE_DAYS"])),
+    ).scalar()
+    with serialized_writes():
+        athlete.last_activity_at = last_activity_at
+        athlete.last_sync_at = now
+        if deep:
+            athlete.last_full_sync_at = now
+        if stats["inserted"] or stats["updated"]:
+            athlete.last_change_at = now
+        athlete.next_sync_at = (scheduled_at or now) + sync_interval(athlete, now, recent_activities)
         db.session.commit()
-    current_app.logger.info('Activities successfully refreshed for athlete %s', athlete.firstname)
+    current_app.logger.info(
+        'Activities successfully refreshed for athlete %s (%d fetched, %d inserted, %d updated)',
+        athlete.firstname, stats["fetched"], stats["inserted"], stats["updated"]
+    )
+    return stats
 
 
-def strava_sync(app):
-    """Synchronize all athletes."""
-    with app.app_context():
-        athletes = Athlete.query.all()
-        for athlete in athletes:
-            sync_athlete(athlete)
+def sync_activity(athlete, activity_id):
+    """
+    Fetch a single activity of {athlete} from Strava and upsert it.
+    Return True if it was inserted or updated.
+    """
+    client = strava_client(athlete)
+    current_app.logger.info('Fetching activity %d of athlete %d', activity_id, athlete.id)
+    activity_item = client.get_activity(activity_id)
+    store_refreshed_token(client, athlete)
+    inserted, updated = upsert_activities(athlete.id, [activity_item])
+    start_date = activity_values(athlete.id, activity_item)["start_date"]
+    if start_date and (athlete.last_activity_at is None or start_date > athlete.last_activity_at):
+        with serialized_writes():
+            athlete.last_activity_at = start_date
+            db.session.commit()
+    return bool(inserted or updated)
 
 
-def compute_athlete_points(athlete):
+def sync_interval(athlete, now, recent_activities):
     """
-    Compute points for a single athlete for every week where they have activities.
-    Only store points > 0, and ensure no DB entry exists for weeks with 0 points.
+    Time until the next sync of {athlete}, who has {recent_activities} activities over the
+    last STRAVA_CADENCE_DAYS days. Athletes who uploaded or changed an activity recently
+    are polled every STRAVA_SYNC_MIN_INTERVAL minutes: "recently" is STRAVA_ACTIVE_DAYS,
+    or twice their usual gap between activities if longer. Beyond that, the interval grows
+    linearly with their inactivity, up to STRAVA_SYNC_MAX_INTERVAL minutes.
     """
-    activities = Activity.query.filter_by(athlete_id=athlete.id).all()
-    weeks = set()
-    for activity in activities:
-        year, week = activity.start_date.isocalendar()[:2]
-        weeks.add((year, week))
+    shortest = timedelta(minutes=int(current_app.config["STRAVA_SYNC_MIN_INTERVAL"]))
+    longest = timedelta(minutes=int(current_app.config["STRAVA_SYNC_MAX_INTERVAL"]))
+    last_news = max(filter(None, [athlete.last_activity_at, athlete.last_change_at]), default=None)
+    if last_news is None:
+        return longest
+    threshold = timedelta(days=int(current_app.config["STRAVA_ACTIVE_DAYS"]))
+    if recent_activities:
+        usual_gap = timedelta(days=int(current_app.config["STRAVA_CADENCE_DAYS"])) / recent_activities
+        threshold = max(threshold, 2 * usual_gap)
+    quiet = now - last_news
+    if quiet <= threshold:
+        return shortest
+    return min(longest, shortest + (longest - shortest) * ((quiet - threshold) / threshold))
 
-    for year, week in weeks:
-        week_activities = [
-            a for a in activities
-            if a.start_date.isocalendar()[:2] == (year, week)
-        ]
-        rules = [
-            Standard(points_per_activity=1),
-            RegularityBonusA(bonus_points=2, week_number=week, year=year),
-            RegularityBonusB(bonus_points=2),
-        ]
-        engine = ContestEngine(rules, year)
-        points = 0
-        for rule in rules:
-            if isinstance(rule, RegularityBonusA):
-                points += RegularityBonusA(rule.bonus_points, week, year).calculate_points(
-                    athlete, week_activities
-                )
+
+def sync_priority(athlete, now):
+    """
+    Sort key of the sync queue: athletes never synchronized come first, then the ones
+    active in the last STRAVA_ACTIVE_DAYS days, then the others. Within a tier, the athlete
+    waiting for the longest time comes first, so deferred athletes move up the queue.
+    """
+    if athlete.last_sync_at is None:
+        tier = 0
+    elif athlete.last_activity_at and \
+            now - athlete.last_activity_at <= timedelta(days=int(current_app.config["STRAVA_ACTIVE_DAYS"])):
+        tier = 1
+    else:
+        tier = 2
+    return tier, athlete.last_sync_at or datetime.min
+
+
+def estimated_calls(athlete, now, activity_count):
+    """Estimate the number of Strava API calls needed to synchronize {athlete}."""
+    deep = _sync_window_start(athlete, now, False)[1]
+    # Athlete details + first page of activities, and every other page on a deep resync
+    calls = 2
+    if deep:
+        calls += activity_count // BatchedResultsIterator.default_per_page
+    return calls
+
+
+def is_rate_limited(error):
+    """Whether a Strava call failed on the rate limit (stravalib raises a plain Fault for a 429)."""
+    if isinstance(error, RateLimitExceeded):
+        return True
+    return getattr(getattr(error, "response", None), "status_code", None) == 429
+
+
+def _sync_athlete_job(app, athlete_id, calls, stop=None, scheduled_at=None):
+    """
+    Synchronize one athlete in its own app context (and thus its own DB session), if the
+    Strava API budget allows {calls} more calls and the batch isn't stopped ({stop} set).
+    {scheduled_at}: see sync_athlete.
+    Return (athlete_id, status, elapsed seconds) where status is one of SYNC_SUCCEEDED,
+    SYNC_FAILED or SYNC_DEFERRED; errors are logged, never raised.
+    """
+    started = time.perf_counter()
+    budget = get_rate_budget(app)
+    metrics = get_metrics(app)
+    if (stop is not None and stop.is_set()) or not budget.try_acquire(calls):
+        metrics.inc("contest_athlete_syncs_total", status=SYNC_DEFERRED)
+        return athlete_id, SYNC_DEFERRED, 0.0
+    with app.app_context():
+        try:
+            stats = sync_athlete(db.session.get(Athlete, athlete_id), scheduled_at=scheduled_at)
+            status = SYNC_SUCCEEDED
+            for result, count in stats.items():
+                metrics.inc("contest_sync_activities_total", count, result=result)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            db.session.rollback()
+            if is_rate_limited(e):
+                budget.exhaust()
+                app.logger.warning('Strava rate limit reached, athlete %d deferred', athlete_id)
+                status = SYNC_DEFERRED
             else:
-                points += rule.calculate_points(athlete, week_activities)
+                app.logger.exception('Synchronization failed for athlete %d', athlete_id)
+                status = SYNC_FAILED
+    elapsed = time.perf_counter() - started
+    metrics.inc("contest_athlete_syncs_total", status=status)
+    metrics.observe("contest_athlete_sync_duration_seconds", elapsed)
+    return athlete_id, status, elapsed
+
+
+def _sync_summary(results, elapsed):
+    """Build the throughput/latency summary of a synchronization batch."""
+    synced = [result for result in results if result[1] != SYNC_DEFERRED]
+    latencies = sorted(result[2] for result in synced)
+    summary = {
+        "athletes": len(results),
+        "succeeded": sum(1 for result in results if result[1] == SYNC_SUCCEEDED),
+        "failed": [result[0] for result in results if result[1] == SYNC_FAILED],
+        "deferred": [result[0] for result in results if result[1] == SYNC_DEFERRED],
+        "elapsed": elapsed,
+        "throughput": len(synced) / elapsed if elapsed > 0 else 0.0,
+        "latency": {},
+    }
+    if latencies:
+        summary["latency"] = {
+            "min": latencies[0],
+            "max": latencies[-1],
+            "mean": statistics.fmean(latencies),
+            "p50": latencies[int(0.50 * (len(latencies) - 1))],
+            "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        }
+    return summary
+
+
+def strava_sync(app, workers=None, stop=None):
+    """
+    Synchronize the athletes due (see sync_interval), using up to {workers} concurrent
+    workers (defaults to STRAVA_SYNC_WORKERS). Athletes are taken by priority (see
+    sync_priority) while the Strava API budget allows it, and until the Event {stop} is
+    set; the others are deferred to the next run. Return a summary of the batch.
+    """
+    with app.app_context():
+        now = utcnow()
+        # Due by the next tick at the latest: a tick running a little late must not push the
+        # athletes due at its own period to the tick after
+        due = now + timedelta(minutes=float(app.config["STRAVA_SYNC_INTERVAL"])) / 2
+        # Deauthorized athletes (no token) can't be synchronized anymore
+        athletes = Athlete.query.filter(
+            Athlete.access_token.isnot(None),
+            or_(Athlete.next_sync_at.is_(None), Athlete.next_sync_at <= due),
+        ).all()
+        activity_counts = dict(
+            db.session.query(Activity.athlete_id, func.count(Activity.id)).group_by(Activity.athlete_id).all()
+        )
+        sync_queue = [
+            (athlete.id, estimated_calls(athlete, now, activity_counts.get(athlete.id, 0)))
+            for athlete in sorted(athletes, key=lambda athlete: sync_priority(athlete, now))
+        ]
+        if workers is None:
+            workers = int(app.config["STRAVA_SYNC_WORKERS"])
+
+    started = time.perf_counter()
+    if workers <= 1:
+        results = [_sync_athlete_job(app, athlete_id, calls, stop, now) for athlete_id, calls in sync_queue]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="strava-sync") as executor:
+            results = list(executor.map(lambda job: _sync_athlete_job(app, *job, stop, now), sync_queue))
+    summary = _sync_summary(results, time.perf_counter() - started)
+    # Shared with the other processes (see api.get_sync_status), along with the budget left
+    with app.app_context(), serialized_writes():
+        db.session.merge(JobReport(name=STRAVA_SYNC_REPORT, finished_at=utcnow(), summary=json.dumps(
+            {**summary, "budget": get_rate_budget(app).snapshot()}
+        )))
+        db.session.commit()
+    get_metrics(app).set("contest_last_success_timestamp_seconds", time.time(), job="sync")
+    app.logger.info(
+        'Synchronized %d athletes (%d failed, %d deferred) in %.2fs with %d worker(s)',
+        summary["athletes"], len(summary["failed"]), len(summary["deferred"]), summary["elapsed"], workers
+    )
+    return summary
 
-        existing = Point.query.filter_by(year=year, week_number=week, athlete_id=athlete.id).first()
+
+def week_points(athlete, year, week, week_activities, weeks_with_activities=None):
+    """
+    Points earned by {athlete} for an ISO week, given the activities of that week and
+    the weeks in which the athlete has valid activities (see rules.active_weeks).
+    """
+    rules = [
+        Standard(points_per_activity=1),
+        RegularityBonusA(
+            bonus_points=2, week_number=week, year=year, weeks_with_activities=weeks_with_activities
+        ),
+        RegularityBonusB(bonus_points=2),
+    ]
+    return sum(rule.calculate_points(athlete, week_activities) for rule in rules)
+
+
+def store_week_points(athlete_id, year, week, points, generations=(0,)):
+    """
+    Store the points of a week, in each of {generations}. Only store points > 0: weeks with
+    0 points have no entry.
+    """
+    for generation in generations:
+        existing = db.session.get(Point, (year, week, athlete_id, generation))
         if points > 0:
             if existing:
                 existing.total_points = points
             else:
                 db.session.add(Point(
-                    year=year, week_number=week, athlete_id=athlete.id, total_points=points
+                    year=year, week_number=week, athlete_id=athlete_id, generation=generation, total_points=points
                 ))
+        elif existing:
+            db.session.delete(existing)
+
+
+def points_retention(app):
+    """How long the retired points generations are kept for a rollback (POINTS_RETENTION)."""
+    return timedelta(hours=float(app.config["POINTS_RETENTION"]))
+
+
+def compute_athlete_points(athlete):
+    """
+    Compute points for a single athlete for every week where they have activities, in
+    every writable generation (see generations.writable_generations).
+    Only store points > 0, and ensure no DB entry exists for weeks with 0 points.
+    """
+    for generation in writable_generations(utcnow(), points_retention(current_app)):
+        store_athlete_points(athlete, generation)
+    DirtyWeek.query.filter_by(athlete_id=athlete.id).delete()
+    db.session.commit()
+
+
+def athlete_week_points(athlete):
+    """Return the points of every week of {athlete} with activities, by (year, week)."""
+    weeks = {}
+    for activity in Activity.query.filter_by(athlete_id=athlete.id):
+        weeks.setdefault(tuple(activity.start_date.isocalendar()[:2]), []).append(activity)
+    weeks_with_activities = active_weeks(athlete.id)
+    return {
+        (year, week): week_points(athlete, year, week, week_activities, weeks_with_activities)
+        for (year, week), week_activities in weeks.items()
+    }
+
+
+def store_athlete_points(athlete, generation):
+    """Compute the points of every week of {athlete} into {generation}. Committed by the caller."""
+    weeks = athlete_week_points(athlete)
+    for (year, week), points in weeks.items():
+        store_week_points(athlete.id, year, week, points, (generation,))
+    # Weeks left without any activity (e.g. deleted on Strava) have no points anymore
+    for point in Point.query.filter_by(athlete_id=athlete.id, generation=generation):
+        if (point.year, point.week_number) not in weeks:
+            db.session.delete(point)
+
+
+def replace_athlete_points(athlete, generation):
+    """
+    Replace the points of {athlete} in the generation being built {generation} with bulk
+    statements, bypassing the session: its leaderboards are built once complete (see
+    compute_full). Committed by the caller.
+    """
+    rows = [
+        {"year": year, "week_number": week, "athlete_id": athlete.id, "generation": generation, "total_points": points}
+        for (year, week), points in athlete_week_points(athlete).items() if points > 0
+    ]
+    # Rows of weeks written meanwhile by the incremental computes, if any
+    deleted = db.session.execute(
+        db.delete(Point).where(Point.athlete_id == athlete.id, Point.generation == generation),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if rows:
+        db.session.execute(insert(Point), rows)
+    count_points_rows(db.session, deleted + len(rows))
+
+
+def compute_athlete_weeks(athlete, weeks, generations=None):
+    """
+    Recompute the points of {athlete} for the given (year, week) buckets only, in
+    {generations} (defaults to every writable generation).
+    """
+    if generations is None:
+        generations = writable_generations(utcnow(), points_retention(current_app))
+    # Only the previous weeks matter (RegularityBonusA), not the whole history
+    weeks_with_activities = active_weeks(athlete.id, [previous_week(*week) for week in weeks])
+    for year, week in weeks:
+        week_start = datetime.fromisocalendar(year, week, 1)
+        week_activities = Activity.query.filter(
+            Activity.athlete_id == athlete.id,
+            Activity.start_date >= week_start,
+            Activity.start_date < week_start + timedelta(weeks=1),
+        ).all()
+        store_week_points(
+            athlete.id, year, week, week_points(athlete, year, week, week_activities, weeks_with_activities),
+            generations,
+        )
+
+
+def mark_weeks_dirty(athlete_id, start_dates):
+    """
+    Flag the weeks of the given activity start dates as needing a points recompute,
+    along with the following weeks (RegularityBonusA looks at the previous week).
+    Added to the session, committed by the caller.
+    """
+    weeks = set()
+    for start_date in filter(None, start_dates):
+        weeks.add(tuple(start_date.isocalendar()[:2]))
+        weeks.add(tuple((start_date + timedelta(weeks=1)).isocalendar()[:2]))
+    if not weeks:
+        return
+    now = utcnow()
+    existing = {
+        (dirty.year, dirty.week_number): dirty
+        for dirty in DirtyWeek.query.filter_by(athlete_id=athlete_id)
+    }
+    for year, week in weeks:
+        if (year, week) in existing:
+            existing[(year, week)].marked_at = now
         else:
-            if existing:
-                db.session.delete(existing)
+            db.session.add(DirtyWeek(athlete_id=athlete_id, year=year, week_number=week, marked_at=now))
+
+
+def compute_dirty_weeks(athlete=None):
+    """
+    Recompute the points of the weeks flagged by mark_weeks_dirty (only those of {athlete}
+    if given), then clear the flags. A week flagged again meanwhile stays flagged.
+    Return the number of weeks recomputed.
+    """
+    query = DirtyWeek.query
+    if athlete is not None:
+        query = query.filter_by(athlete_id=athlete.id)
+    dirty_weeks = query.order_by(DirtyWeek.athlete_id).all()
+    weeks_by_athlete = {}
+    for dirty in dirty_weeks:
+        weeks_by_athlete.setdefault(dirty.athlete_id, []).append((dirty.year, dirty.week_number))
+    generations = writable_generations(utcnow(), points_retention(current_app))
+    for athlete_id, weeks in weeks_by_athlete.items():
+        compute_athlete_weeks(db.session.get(Athlete, athlete_id), weeks, generations)
+    # Not synchronized with the session: evaluating each delete against every instance it
+    # holds would make the computation quadratic
+    for dirty in dirty_weeks:
+        DirtyWeek.query.filter_by(
+            athlete_id=dirty.athlete_id, year=dirty.year, week_number=dirty.week_number,
+            marked_at=dirty.marked_at,
+        ).delete(synchronize_session=False)
     db.session.commit()
+    return len(dirty_weeks)
 
 
-def compute(app):
+def compute_full(app):
     """
-    Compute points for all athletes.
+    Recompute every week of every athlete into a new points generation, then activate it:
+    until then the leaderboards show the previous generation, never a mix of both, and a
+    crash leaves it untouched. Incremental computes meanwhile write to both generations.
+    The previous generation is kept for POINTS_RETENTION hours (see rollback_points).
     """
+    generation = start_generation(utcnow())
+    try:
+        # One athlete in the session at a time: every commit expires the instances it holds
+        for athlete_id in db.session.scalars(select(Athlete.id)).all():
+            with serialized_writes():
+                replace_athlete_points(db.session.get(Athlete, athlete_id), generation)
+                db.session.commit()
+        # Along with the activation: no incremental compute may change the points in between
+        with serialized_writes():
+            rebuild_leaderboards(generation)
+            activate_generation(generation, utcnow())
+    except Exception:
+        db.session.rollback()
+        fail_generation(generation, utcnow())
+        raise
+    with serialized_writes():
+        purged = purge_generations(utcnow(), points_retention(app))
+    app.logger.info('Activated points generation %d (%d expired generation(s) purged)', generation, purged)
+
+
+def rollback_points(app):
+    """Activate again the last retired points generation, if still kept. Return its id, or None."""
+    with serialized_writes():
+        now = utcnow()
+        previous = previous_generation(now, points_retention(app))
+        if previous is None:
+            return None
+        activate_generation(previous.id, now)
+        return previous.id
+
+
+def compute(app, full=False):
+    """
+    Compute points. Only the weeks changed since the last run are recomputed, unless {full}
+    is set (e.g. after a rule change): then every week of every athlete is (see compute_full).
+    """
+    mode = "full" if full else "incremental"
+    started = time.perf_counter()
     with app.app_context():
-        for athlete in Athlete.query.all():
-            compute_athlete_points(athlete)
+        if full:
+            compute_full(app)
+        else:
+            # Push events and onboarding threads compute points too
+            with serialized_writes():
+                weeks = compute_dirty_weeks()
+            app.logger.info('Recomputed points of %d week(s)', weeks)
+    metrics = get_metrics(app)
+    metrics.observe("contest_compute_duration_seconds", time.perf_counter() - started, mode=mode)
+    metrics.set("contest_last_success_timestamp_seconds", time.time(), job=f"compute_{mode}")
+
+
+@click.command("compute-points")
+@click.option("--full", is_flag=True, help="Recompute every week of every athlete (e.g. after a rule change).")
+@click.option("--rollback", is_flag=True, help="Show the points of the previous full recompute again.")
+def compute_points_command(full, rollback):
+    """Compute contest points."""
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+    if rollback:
+        generation = rollback_points(app)
+        if generation is None:
+            click.echo("No generation to roll back to")
+        else:
+            click.echo(f"Points generation {generation} activated")
+        return
+    compute(app, full=full)
@@ -4,6 +4,7 @@ from flask_login import login_required, current_user
 from .forms import ChangePasswordForm, AdminSiteConfigForm
 from .extensions import db
 from .models import SiteConfig
+from .site_config import site_config
 
 views = Blueprint("views", __name__)
 
@@ -18,7 +19,7 @@ def admin_required(func):
 @views.app_context_processor
 def inject_theme():
     dark_themes = ['cyborg', 'darkly', 'slate', 'superhero']
-    config = {c.key: c.value for c in SiteConfig.query.all()}
+    config = site_config()
     site_theme = config.get("theme", "default")
     site_primary_color = config.get("primary_color", "#0d6efd")
     dashboard_title = config.get("dashboard_title", "Strava Contest")
@@ -65,7 +66,8 @@ def admin_dashboard():
 @views.route("/admin/settings", methods=["GET", "POST"])
 @admin_required
 def admin_settings():
-    config = {c.key: c.value for c in SiteConfig.query.all()}
+    rows = {c.key: c for c in SiteConfig.query.all()}
+    config = {key: row.value for key, row in rows.items()}
     form = AdminSiteConfigForm(
         dashboard_title=config.get("dashboard_title", "Strava Contest"),
         theme=config.get("theme", "default"),
@@ -74,52 +76,39 @@ def admin_settings():
         banner=config.get("banner", "")
     )
     if form.validate_on_submit():
+        def set_value(key, value):
+            if key not in rows:
+                rows[key] = SiteConfig(key=key)
+                db.session.add(rows[key])
+            rows[key].value = value
+
+        def delete_value(key):
+            if key in rows:
+                db.session.delete(rows.pop(key))
+
         # Save dashboard_title
-        title_row = SiteConfig.query.filter_by(key="dashboard_title").first()
-        if not title_row:
-            title_row = SiteConfig(key="dashboard_title")
-            db.session.add(title_row)
-        title_row.value = form.dashboard_title.data
+        set_value("dashboard_title", form.dashboard_title.data)
 
         theme = form.theme.data
-        theme_row = SiteConfig.query.filter_by(key="theme").first()
         if theme == "default":
             # Remove the theme entry if it exists
-            if theme_row:
-                db.session.delete(theme_row)
-            color = form.primary_color.data or "#0d6efd"
-            color_row = SiteConfig.query.filter_by(key="primary_color").first()
-            if not color_row:
-                color_row = SiteConfig(key="primary_color")
-                db.session.add(color_row)
-            color_row.value = color
+            delete_value("theme")
+            set_value("primary_color", form.primary_color.data or "#0d6efd")
         else:
-            if not theme_row:
-                theme_row = SiteConfig(key="theme")
-                db.session.add(theme_row)
-            theme_row.value = theme
+            set_value("theme", theme)
             # Delete primary_color row if it exists
-            color_row = SiteConfig.query.filter_by(key="primary_color").first()
-            if color_row:
-                db.session.delete(color_row)
+            delete_value("primary_color")
 
         # Save logo file if uploaded
         if form.logo.data:
             logo_file = form.logo.data
             logo_path = "static/uploads/logo.png"
             logo_file.save(logo_path)
-            logo_row = SiteConfig.query.filter_by(key="logo_path").first()
-            if not logo_row:
-                logo_row = SiteConfig(key="logo_path")
-                db.session.add(logo_row)
-            logo_row.value = logo_path
+            set_value("logo_path", logo_path)
 
         # Save banner text
-        banner_row = SiteConfig.query.filter_by(key="banner").first()
-        if not banner_row:
-            banner_row = SiteConfig(key="banner")
-            db.session.add(banner_row)
-        banner_row.value = form.banner.data
+        set_value("banner", form.banner.data)
+        # Also bumps the SiteConfig version: every process reloads its cache
         db.session.commit()
 
         flash("Settings updated!", "success")
@@ -0,0 +1,143 @@
+import queue
+import threading
+from urllib.parse import urlsplit
+from flask import Blueprint, current_app, jsonify, request
+from stravalib.exc import AccessUnauthorized, Fault
+from .extensions import db
+from .models import Athlete, Activity, DirtyWeek, Point
+from .tasks import compute_dirty_weeks, mark_weeks_dirty, serialized_writes, strava_client, sync_activity
+
+webhook = Blueprint("webhook", __name__)
+
+# Events are acknowledged right away (Strava expects an answer within 2 seconds)
+# and processed by a background worker. The queue is in-memory: events lost on
+# restart are caught up by the periodic polling sync.
+_events = queue.Queue()
+_worker_lock = threading.Lock()
+
+
+@webhook.route("/webhook", methods=["GET"])
+def validate_subscription():
+    """Answer the subscription validation handshake sent by Strava."""
+    if request.args.get("hub.mode") != "subscribe":
+        return jsonify({"error": "Unsupported mode"}), 400
+    if request.args.get("hub.verify_token") != current_app.config["STRAVA_WEBHOOK_VERIFY_TOKEN"]:
+        return jsonify({"error": "Invalid verify token"}), 403
+    return jsonify({"hub.challenge": request.args.get("hub.challenge")}), 200
+
+
+@webhook.route("/webhook", methods=["POST"])
+def receive_event():
+    event = request.get_json(silent=True)
+    if not isinstance(event, dict) or not {"object_type", "object_id", "aspect_type", "owner_id"} <= event.keys():
+        return jsonify({"error": "Invalid event"}), 400
+    # Events carry no signature: only those of our subscription are accepted, and none
+    # while it isn't configured
+    subscription_id = current_app.config["STRAVA_WEBHOOK_SUBSCRIPTION_ID"]
+    if not subscription_id or str(event.get("subscription_id")) != str(subscription_id):
+        return jsonify({"error": "Unknown subscription"}), 403
+
+    if current_app.config["STRAVA_WEBHOOK_ASYNC"]:
+        enqueue_event(current_app._get_current_object(), event)  # pylint: disable=protected-access
+    else:
+        process_event(event)
+    return jsonify({"status": "accepted"}), 200
+
+
+def enqueue_event(app, event):
+    """Queue an event for the background worker, starting it if needed."""
+    _events.put(event)
+    with _worker_lock:
+        worker = app.extensions.get("strava_webhook_worker")
+        if worker is None or not worker.is_alive():
+            worker = threading.Thread(
+                target=_process_events, args=(app,), name="strava-webhook", daemon=True
+            )
+            app.extensions["strava_webhook_worker"] = worker
+            worker.start()
+
+
+def _process_events(app):
+    while True:
+        event = _events.get()
+        with app.app_context():
+            try:
+                process_event(event)
+            except Exception:  # pylint: disable=broad-exception-caught
+                db.session.rollback()
+                app.logger.exception('Failed to process Strava event %s', event)
+        _events.task_done()
+
+
+def process_event(event):
+    """
+    Apply a Strava push event: fetch the created/updated activity, drop a deleted one,
+    or forget a deauthorized athlete. The points of the affected weeks are then recomputed.
+    """
+    athlete = db.session.get(Athlete, event["owner_id"])
+    if athlete is None:
+        current_app.logger.info('Ignoring Strava event for unknown athlete %s', event["owner_id"])
+        return
+
+    if event["object_type"] == "athlete":
+        if str(event.get("updates", {}).get("authorized", "")).lower() == "false":
+            if access_revoked(athlete):
+                deauthorize_athlete(athlete)
+            else:
+                current_app.logger.warning('Ignoring deauthorization of athlete %d: Strava still accepts the token',
+                                           athlete.id)
+        return
+
+    if event["object_type"] != "activity" or not athlete.access_token:
+        return
+    if event["aspect_type"] in ("create", "update"):
+        sync_activity(athlete, event["object_id"])
+    elif event["aspect_type"] == "delete":
+        activity = Activity.query.filter_by(id=event["object_id"], athlete_id=athlete.id).first()
+        if activity is None:
+            return
+        with serialized_writes():
+            mark_weeks_dirty(athlete.id, [activity.start_date])
+            db.session.delete(activity)
+            db.session.commit()
+    else:
+        return
+    with serialized_writes():
+        compute_dirty_weeks(athlete)
+
+
+def access_revoked(athlete):
+    """
+    Confirm with Strava that {athlete} revoked our access (events can be forged): their
+    token is refused (401), or their refresh token if it had expired. Other errors are raised.
+    """
+    if not athlete.access_token:
+        return True
+    try:
+        strava_client(athlete).get_athlete()
+    except AccessUnauthorized:
+        return True
+    except Fault as e:
+        response = e.response
+        if response is not None and response.status_code == 400 and \
+                urlsplit(response.request.url).path == "/oauth/token":
+            return True
+        raise
+    return False
+
+
+def deauthorize_athlete(athlete):
+    """The athlete revoked our access: drop the tokens and their Strava data."""
+    current_app.logger.info('Athlete %d deauthorized the application', athlete.id)
+    with serialized_writes():
+        # One by one, so that the leaderboards are refreshed (see leaderboard.py)
+        for point in Point.query.filter_by(athlete_id=athlete.id):
+            db.session.delete(point)
+        DirtyWeek.query.filter_by(athlete_id=athlete.id).delete()
+        Activity.query.filter_by(athlete_id=athlete.id).delete()
+        athlete.access_token = None
+        athlete.refresh_token = None
+        athlete.expires_at = None
+        athlete.last_activity_at = None
+        athlete.last_full_sync_at = None
+        db.session.commit()
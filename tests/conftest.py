@@ -3,9 +3,10 @@ from datetime import datetime
 from unittest.mock import MagicMock, patch
 import pytest
 from contest import create_app
-from contest.extensions import db
+from contest.extensions import READ_ENGINE, db
 from contest.init_defaults import initialize_defaults
 from config import TestConfig
+from benchmarks import dataset
 
 
 @pytest.fixture()
@@ -13,6 +14,21 @@ def app_fixture():
     app = create_app(TestConfig)
     return app
 
+@pytest.fixture()
+def file_app(tmp_path):
+    """
+    App on a SQLite file, for tests needing several connections (threads, read engine).
+    """
+    class FileTestConfig(TestConfig):  # pylint: disable=too-few-public-methods
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'contest.sqlite'}"
+        SQLITE_READ_ENGINE = True
+
+    app = create_app(FileTestConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    app.extensions[READ_ENGINE].dispose()
+
 @pytest.fixture(scope='function')
 def client(app_fixture):
     return app_fixture.test_client()
@@ -62,3 +78,14 @@ def mock_stravalib_client():
         }
 
         yield mock_client
+
+
+@pytest.fixture()
+def strava_activity():
+    """
+    Factory of activities as returned by stravalib: strava_activity(id, start_date, **columns),
+    a 30-minute run by default (see benchmarks.dataset.activity_values).
+    """
+    def make_activity(activity_id, start_date, **values):
+        return dataset.strava_activity(dataset.activity_values(activity_id, start_date, **values))
+    return make_activity
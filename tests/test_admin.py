@@ -1,6 +1,9 @@
 # pylint: disable=redefined-outer-name
 import pytest
-from contest.models import User
+from sqlalchemy import update
+from contest.counters import bump_counter
+from contest.models import SiteConfig, User
+from contest.site_config import SITE_CONFIG_VERSION, SiteConfigCache
 
 @pytest.fixture
 def admin_credentials(app_fixture):
@@ -49,3 +52,27 @@ def test_admin_settings_post_theme(client, admin_credentials):
     )
     assert resp.status_code == 200
     assert b"Settings updated" in resp.data
+
+def test_admin_settings_refresh_site_config(client, admin_credentials):
+    client.post("/login", data=admin_credentials, follow_redirects=True)
+    assert b"Strava Contest" in client.get("/").data
+    client.post(
+        "/admin/settings",
+        data={'theme': 'default', 'primary_color': '#123456', 'dashboard_title': 'New Title'},
+    )
+    assert b"New Title" in client.get("/").data
+    assert SiteConfig.query.filter_by(key="primary_color").one().value == "#123456"
+
+def test_site_config_cache_version_check(db_session):
+    cache = SiteConfigCache(check_interval=60)
+    assert cache.values()["dashboard_title"] == "Strava Contest"
+
+    # Another process saves the settings: bulk update, the local cache isn't invalidated
+    db_session.execute(update(SiteConfig).where(SiteConfig.key == "dashboard_title").values(value="New Title"))
+    bump_counter(SITE_CONFIG_VERSION)
+    db_session.commit()
+    assert cache.values()["dashboard_title"] == "Strava Contest"
+
+    # Picked up at the next version check
+    cache.check_interval = 0
+    assert cache.values()["dashboard_title"] == "New Title"
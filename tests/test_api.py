@@ -1,5 +1,6 @@
 # pylint: disable=unused-argument,redefined-outer-name
 
+from datetime import datetime
 import pytest
 from contest.models import Athlete, Point, Activity, User
 
@@ -135,3 +136,81 @@ def test_my_activities_no_athlete(client, db_session):
     assert response.status_code == 404
     data = response.get_json()
     assert "error" in data
+
+def test_leaderboard_api_etag(client, sample_data):
+    response = client.get("/api/v1/leaderboard?week=1&month=1&year=2025")
+    etag = response.headers["ETag"]
+    assert not response.headers["ETag"].startswith("W/")
+
+    response = client.get("/api/v1/leaderboard?week=1&month=1&year=2025", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    response = client.get("/api/v1/leaderboard?week=2&month=1&year=2025", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+def test_leaderboard_api_cache_follows_points(client, db_session, sample_data):
+    url = "/api/v1/leaderboard?week=3&month=1&year=2025"
+    first = client.get(url)
+    assert client.get(url).headers["ETag"] == first.headers["ETag"]
+
+    # Writing points bumps the leaderboard version: the cached payload is not served anymore
+    db_session.get(Point, (2025, 3, 3, 0)).total_points = 1
+    db_session.commit()
+    response = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.get_json()["week_points"][0]["points"] == 1
+
+def test_my_activities_polyline_opt_in(client, db_session):
+    athlete = Athlete(firstname="Test", lastname="User")
+    db_session.add(athlete)
+    db_session.commit()
+    user = User(email="test@example.com", athlete_id=athlete.id)
+    db_session.add(user)
+    db_session.add(Activity(id=1, athlete_id=athlete.id, name="Workout 1", polyline="abc"))
+    db_session.commit()
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+
+    response = client.get("/api/v1/my_activities")
+    assert "polyline" not in response.get_json()["activities"][0]
+
+    response = client.get("/api/v1/my_activities?fields=polyline")
+    assert response.get_json()["activities"][0]["polyline"] == "abc"
+
+    response = client.get("/api/v1/my_activities?fields=polyline,heartrate")
+    assert response.status_code == 400
+
+def test_my_activities_cursor_pagination(client, db_session):
+    athlete = Athlete(firstname="Test", lastname="User")
+    db_session.add(athlete)
+    db_session.commit()
+    user = User(email="test@example.com", athlete_id=athlete.id)
+    db_session.add(user)
+    # Two activities share a start date: the id breaks the tie
+    db_session.add_all([
+        Activity(id=i, athlete_id=athlete.id, name=f"Workout {i}", start_date=datetime(2025, 1, 1 + i // 2))
+        for i in range(7)
+    ])
+    db_session.commit()
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+
+    ids, cursor, pages = [], "", 0
+    while cursor is not None:
+        data = client.get(f"/api/v1/my_activities?per_page=3&total=1&cursor={cursor}").get_json()
+        assert data["total"] == 7
+        ids += [activity["id"] for activity in data["activities"]]
+        cursor = data["next_cursor"]
+        pages += 1
+    assert pages == 3
+    assert ids == [6, 5, 4, 3, 2, 1, 0]
+
+    # The offset pagination returns the same order
+    data = client.get("/api/v1/my_activities?per_page=3&page=2").get_json()
+    assert [activity["id"] for activity in data["activities"]] == [3, 2, 1]
+
+    response = client.get("/api/v1/my_activities?cursor=garbage")
+    assert response.status_code == 400
@@ -0,0 +1,41 @@
+# pylint: disable=unused-argument
+import json
+from datetime import date
+from unittest.mock import patch
+import stravalib
+from benchmarks.dataset import generate_club
+from benchmarks.suite import run_suite
+
+
+def test_synthetic_club_is_reproducible_and_weekly():
+    club = generate_club(athletes=20, years=1, seed=3, end=date(2025, 6, 1))
+    assert [athlete.activities() for athlete in club] == [
+        athlete.activities() for athlete in generate_club(athletes=20, years=1, seed=3, end=date(2025, 6, 1))
+    ]
+    activities = [activity for athlete in club for activity in athlete.activities()]
+    assert len({activity["id"] for activity in activities}) == len(activities)
+    assert all(date(2024, 5, 27) <= activity["start_date"].date() <= date(2025, 6, 1) for activity in activities)
+    # Newest first, at most one a day, around 2 sessions a week on average
+    for athlete in club:
+        days = [activity["start_date"].date() for activity in athlete.activities()]
+        assert days == sorted(set(days), reverse=True)
+    assert 1 < len(activities) / 20 / 52 < 4
+
+
+def test_run_suite(tmp_path):
+    results = run_suite(tmp_path / "benchmark.sqlite", athletes=10, years=0.25, sample=2, repeat=2)
+    json.dumps(results)
+    assert results["dataset"]["activities"] > 0
+    assert set(results["results"]) == {
+        "store_club", "sync_athlete", "compute_full", "compute_incremental", "contest_engine_all_weeks",
+        "get_week_data", "get_month_data", "get_year_data",
+    }
+    assert results["results"]["sync_athlete"]["runs"] == 2
+    assert results["results"]["get_week_data"]["runs"] == 2
+
+
+def test_run_suite_against_fake_strava(tmp_path):
+    with patch("contest.tasks.Client", stravalib.Client):
+        results = run_suite(tmp_path / "benchmark.sqlite", athletes=3, years=0.25, sample=2, repeat=1, strava_latency=0)
+    assert results["parameters"]["strava_latency"] == 0
+    assert results["results"]["sync_athlete"]["runs"] == 2
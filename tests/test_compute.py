@@ -0,0 +1,232 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import pytest
+from sqlalchemy import event
+from contest.api import get_year_data
+from contest.extensions import db
+from contest.generations import active_points_generation, start_generation
+from contest.leaderboard import leaderboard_version
+from contest.metrics import get_metrics
+from contest.models import Activity, Athlete, DirtyWeek, Point, PointsGeneration
+from contest.tasks import compute, rollback_points, serialized_writes, upsert_activities
+
+
+def points(athlete_id=1):
+    """Points shown by the leaderboards (active generation)."""
+    return {
+        (p.year, p.week_number): p.total_points
+        for p in Point.query.filter_by(athlete_id=athlete_id, generation=active_points_generation())
+    }
+
+
+@pytest.fixture
+def athlete(db_session):
+    athlete = Athlete(id=1, firstname="Test")
+    db_session.add(athlete)
+    db_session.commit()
+    return athlete
+
+
+def test_upsert_marks_week_and_following_week_dirty(athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 5, 8))])
+    dirty = {(d.year, d.week_number) for d in DirtyWeek.query.filter_by(athlete_id=1)}
+    assert dirty == {(2025, 10), (2025, 11)}
+
+
+def test_compute_only_recomputes_dirty_weeks(app_fixture, athlete, db_session, strava_activity):
+    monday = datetime(2025, 3, 3, 8)
+    upsert_activities(1, [strava_activity(i, monday + timedelta(days=i)) for i in range(4)])
+    compute(app_fixture)
+    assert points() == {(2025, 10): 6}
+    assert DirtyWeek.query.count() == 0
+
+    # Points stored for a week that is not flagged are left untouched
+    db_session.add(Point(year=2024, week_number=1, athlete_id=1, total_points=99))
+    db_session.commit()
+    upsert_activities(1, [strava_activity(10, monday + timedelta(weeks=1))])
+    compute(app_fixture)
+    assert points() == {(2024, 1): 99, (2025, 10): 6, (2025, 11): 3}
+
+    # The full recompute rebuilds every week from the activities
+    compute(app_fixture, full=True)
+    assert points() == {(2025, 10): 6, (2025, 11): 3}
+
+
+def test_moved_activity_recomputes_old_and_new_weeks(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 5, 8))])
+    compute(app_fixture)
+    assert points() == {(2025, 10): 1}
+
+    upsert_activities(1, [strava_activity(1, datetime(2025, 4, 2, 8))])
+    compute(app_fixture)
+    assert points() == {(2025, 14): 1}
+
+
+def test_incremental_compute_matches_full_compute(app_fixture, athlete, db_session, strava_activity):
+    start = datetime(2024, 11, 4, 7)
+    activities = [
+        strava_activity(i, start + timedelta(days=i * 2, hours=i % 5), moving_time=600 + 300 * (i % 7))
+        for i in range(60)
+    ]
+    for i in range(0, 60, 20):
+        upsert_activities(1, activities[i:i + 20])
+        compute(app_fixture)
+    incremental = points()
+
+    Point.query.delete()
+    db_session.commit()
+    compute(app_fixture, full=True)
+    assert points() == incremental
+
+
+def test_compute_points_command(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 5, 8))])
+    result = app_fixture.test_cli_runner().invoke(args=["compute-points", "--full"])
+    assert result.exit_code == 0
+    assert points() == {(2025, 10): 1}
+    assert Activity.query.count() == 1
+
+
+def test_compute_does_not_load_polylines(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 5, 8))])
+    statements = []
+
+    def listener(_conn, _cursor, statement, *_):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        compute(app_fixture, full=True)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert statements
+    assert not [statement for statement in statements if "polyline" in statement]
+
+
+def test_incremental_compute_reads_the_previous_weeks_only(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2024, 3, 5, 8)), strava_activity(2, datetime(2025, 3, 3, 8))])
+    compute(app_fixture)
+    upsert_activities(1, [strava_activity(3, datetime(2025, 3, 10, 8))])
+    statements = []
+
+    def listener(_conn, _cursor, statement, parameters, *_):
+        statements.append((statement, parameters))
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        compute(app_fixture)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    # Weeks 11 and 12 recomputed: the activity days of weeks 10 and 11 are looked up, not the history
+    days_queries = [parameters for statement, parameters in statements if "date(activity.start_date)" in statement]
+    assert days_queries
+    assert all("2025-03-03 00:00:00" in str(parameters) for parameters in days_queries)
+    assert not any("2024-" in str(parameters) for parameters in days_queries)
+    assert points() == {(2024, 10): 1, (2025, 10): 1, (2025, 11): 3}
+
+
+def test_full_compute_swaps_generations(app_fixture, athlete, db_session, strava_activity):
+    monday = datetime(2025, 3, 3, 8)
+    upsert_activities(1, [strava_activity(i, monday + timedelta(days=i)) for i in range(2)])
+    compute(app_fixture)
+    assert points() == {(2025, 10): 2}
+
+    # While the new generation is built, the leaderboards show the active one only,
+    # incremental computes keeping both up to date
+    with patch("contest.tasks.rebuild_leaderboards", side_effect=RuntimeError("crash")):
+        with pytest.raises(RuntimeError):
+            compute(app_fixture, full=True)
+    assert active_points_generation() == 0
+    assert points() == {(2025, 10): 2}
+    assert get_year_data(2025)[0]["points"] == 2
+
+    compute(app_fixture, full=True)
+    assert active_points_generation() == 2
+    assert points() == {(2025, 10): 2}
+    assert get_year_data(2025)[0]["points"] == 2
+    # The failed generation is purged, the previous one kept for a rollback
+    assert {g.id: g.status for g in PointsGeneration.query} == {0: "retired", 2: "active"}
+    assert {p.generation for p in Point.query} == {0, 2}
+
+
+def test_incremental_compute_writes_to_the_generation_being_built(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 3, 8))])
+    compute(app_fixture)
+    building = start_generation(datetime(2025, 3, 4))
+    upsert_activities(1, [strava_activity(2, datetime(2025, 3, 4, 8))])
+    compute(app_fixture)
+    assert {(p.generation, p.week_number): p.total_points for p in Point.query} == {(0, 10): 2, (building, 10): 2}
+    assert points() == {(2025, 10): 2}
+
+
+def test_full_compute_replaces_the_points_of_the_incremental_computes(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 3, 8)), strava_activity(2, datetime(2025, 3, 10, 8))])
+    compute(app_fixture)
+    version = leaderboard_version()
+    # A full compute crashed (or still running) after an incremental one wrote to its generation
+    start_generation(datetime(2025, 3, 4))
+    upsert_activities(1, [strava_activity(3, datetime(2025, 3, 4, 8))])
+    compute(app_fixture)
+    assert leaderboard_version() == version + 1
+
+    written = get_metrics(app_fixture).collect()[("contest_points_rows_written_total", ())]
+    with patch("contest.tasks.start_generation", return_value=1):
+        compute(app_fixture, full=True)
+    assert active_points_generation() == 1
+    assert points() == {(2025, 10): 2, (2025, 11): 3}
+    assert get_year_data(2025)[0]["points"] == 5
+    # Only the activation invalidates the cached leaderboards
+    assert leaderboard_version() == version + 2
+    # Bulk statements: the 2 rows of the incremental compute deleted, 2 inserted
+    assert get_metrics(app_fixture).collect()[("contest_points_rows_written_total", ())] == written + 4
+
+
+def test_rollback_points(app_fixture, athlete, db_session, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 3, 8))])
+    compute(app_fixture)
+    compute(app_fixture, full=True)
+    db_session.get(Point, (2025, 10, 1, 1)).total_points = 5
+    db_session.commit()
+    assert points() == {(2025, 10): 5}
+
+    runner = app_fixture.test_cli_runner()
+    result = runner.invoke(args=["compute-points", "--rollback"])
+    assert "Points generation 0 activated" in result.output
+    assert points() == {(2025, 10): 1}
+    assert get_year_data(2025)[0]["points"] == 1
+
+    # Retired generations are purged after POINTS_RETENTION hours
+    app_fixture.config["POINTS_RETENTION"] = 0
+    compute(app_fixture, full=True)
+    assert {g.id for g in PointsGeneration.query} == {2}
+    assert "No generation to roll back to" in runner.invoke(args=["compute-points", "--rollback"]).output
+
+
+def test_rollback_keeps_the_points_synced_since(app_fixture, athlete, strava_activity):
+    upsert_activities(1, [strava_activity(1, datetime(2025, 3, 3, 8))])
+    compute(app_fixture)
+    compute(app_fixture, full=True)
+    # Synced after the full recompute: written to the retired generation too
+    upsert_activities(1, [strava_activity(2, datetime(2025, 3, 4, 8))])
+    compute(app_fixture)
+    assert rollback_points(app_fixture) == 0
+    assert points() == {(2025, 10): 2}
+    assert get_year_data(2025)[0]["points"] == 2
+
+    # Not the generations purged, nor the failed ones
+    app_fixture.config["POINTS_RETENTION"] = 0
+    compute(app_fixture, full=True)
+    upsert_activities(1, [strava_activity(3, datetime(2025, 3, 5, 8))])
+    compute(app_fixture)
+    assert {p.generation for p in Point.query} == {2}
+
+
+def test_compute_waits_for_the_other_writers(app_fixture):
+    # e.g. a push event being applied in another thread
+    with serialized_writes():
+        worker = threading.Thread(target=compute, args=(app_fixture,))
+        worker.start()
+        worker.join(0.2)
+        assert worker.is_alive()
+    worker.join(5)
+    assert not worker.is_alive()
@@ -0,0 +1,79 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import json
+from datetime import datetime
+import pytest
+from contest.models import Activity, Athlete, Point, User
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def login(client, user):
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+
+
+@pytest.fixture
+def user(db_session):
+    db_session.add_all([Athlete(id=1, firstname="Alice"), Athlete(id=2, firstname="Bob")])
+    db_session.add_all([
+        Activity(id=1, athlete_id=1, name="Run", type="Run", start_date=datetime(2025, 1, 6, 8), polyline="abc"),
+        Activity(id=2, athlete_id=1, name="Ride", type="Ride", start_date=datetime(2025, 1, 12, 23)),
+        Activity(id=3, athlete_id=1, name="Run", type="Run", start_date=datetime(2025, 2, 3, 8)),
+        Activity(id=4, athlete_id=2, name="Run", type="Run", start_date=datetime(2025, 1, 7, 8)),
+    ])
+    db_session.add_all([
+        Point(year=2025, week_number=2, athlete_id=1, total_points=2),
+        Point(year=2025, week_number=6, athlete_id=1, total_points=1),
+        Point(year=2025, week_number=2, athlete_id=2, total_points=1),
+    ])
+    user = User(email="alice@example.com", athlete_id=1)
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def test_export_my_activities(client, user):
+    login(client, user)
+    response = client.get("/api/v1/export/activities")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    rows = ndjson(response)
+    assert [row["id"] for row in rows] == [1, 2, 3]
+    assert rows[0]["start_date"] == "2025-01-06T08:00:00"
+    assert "polyline" not in rows[0]
+
+    rows = ndjson(client.get("/api/v1/export/activities?after=2025-01-01&before=2025-01-12&type=Ride"))
+    assert [row["id"] for row in rows] == [2]
+    rows = ndjson(client.get("/api/v1/export/activities?fields=polyline"))
+    assert rows[0]["polyline"] == "abc"
+
+    assert client.get("/api/v1/export/activities?after=yesterday").status_code == 400
+
+
+def test_export_my_points(client, user):
+    login(client, user)
+    rows = ndjson(client.get("/api/v1/export/points"))
+    assert rows == [
+        {"athlete_id": 1, "year": 2025, "week_number": 2, "total_points": 2},
+        {"athlete_id": 1, "year": 2025, "week_number": 6, "total_points": 1},
+    ]
+    # Weeks overlapping the range
+    rows = ndjson(client.get("/api/v1/export/points?after=2025-02-08"))
+    assert [row["week_number"] for row in rows] == [6]
+
+
+def test_export_all_requires_admin(client, user):
+    login(client, user)
+    assert client.get("/api/v1/export/all/activities").status_code == 403
+
+
+def test_export_all(client, app_fixture, user):
+    client.post("/login", data={
+        "email": app_fixture.config["ADMIN_EMAIL"], "password": app_fixture.config["ADMIN_PASSWORD"]
+    })
+    rows = ndjson(client.get("/api/v1/export/all/activities"))
+    assert [row["id"] for row in rows] == [1, 2, 3, 4]
+    rows = ndjson(client.get("/api/v1/export/all/points?athlete_id=2"))
+    assert rows == [{"athlete_id": 2, "year": 2025, "week_number": 2, "total_points": 1}]
@@ -0,0 +1,61 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import time
+from unittest.mock import patch
+import pytest
+import stravalib
+from benchmarks.dataset import generate_club, store_club
+from benchmarks.fake_strava import FakeStrava
+from contest.extensions import db
+from contest.models import Activity, Athlete
+from contest.tasks import strava_sync, sync_activity, sync_athlete
+
+# Ending today: within the window of a deep resync
+CLUB = generate_club(athletes=3, years=0.25, seed=5)
+
+
+@pytest.fixture()
+def strava(app_fixture):
+    """Fake Strava server serving CLUB, used by the real stravalib client."""
+    with FakeStrava(club=CLUB) as fake, patch("contest.tasks.Client", stravalib.Client):
+        app_fixture.config.update(STRAVA_API_ORIGIN=fake.origin, STRAVA_CLIENT_ID="1", STRAVA_CLIENT_SECRET="secret")
+        store_club(CLUB, athletes=set())
+        yield fake
+
+
+def test_sync_against_fake_strava(app_fixture, strava):
+    stats = sync_athlete(db.session.get(Athlete, 1), full=True)
+    activities = CLUB[0].activities()
+    assert stats["fetched"] == stats["inserted"] == len(activities)
+    assert [activity.id for activity in Activity.query.order_by(Activity.start_date.desc())] == [
+        values["id"] for values in activities
+    ]
+    assert strava.stats["connections"] == 1
+
+
+def test_expired_token_is_refreshed(app_fixture, strava):
+    athlete = db.session.get(Athlete, 2)
+    athlete.expires_at = int(time.time()) - 60
+    db.session.commit()
+    sync_athlete(athlete)
+    assert strava.events["token_refreshes"] == 1
+    assert athlete.access_token.startswith("token2.")
+    assert athlete.expires_at > time.time()
+
+
+def test_activity_detail_and_injected_errors(app_fixture, strava):
+    activity_id = CLUB[2].activities()[0]["id"]
+    assert sync_activity(db.session.get(Athlete, 3), activity_id)
+    assert db.session.get(Activity, activity_id).athlete_id == 3
+    strava.error_rate = 1.0
+    with pytest.raises(stravalib.exc.Fault):
+        sync_activity(db.session.get(Athlete, 3), activity_id)
+    assert strava.events["errors"] == 1
+
+
+def test_rate_limited_sync_is_deferred(app_fixture, strava):
+    strava.rate_limit = (1, 1000)
+    summary = strava_sync(app_fixture)
+    assert summary["succeeded"] == 0
+    assert summary["deferred"] == [1, 2, 3]
+    assert strava.events["rate_limited"] >= 1
+    assert db.session.get(Athlete, 1).last_sync_at is None
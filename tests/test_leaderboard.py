@@ -0,0 +1,113 @@
+# pylint: disable=unused-argument,redefined-outer-name
+from datetime import datetime
+import pytest
+from contest.leaderboard import (
+    LeaderboardCache, get_month_weeks, leaderboard_version, rebuild_leaderboards, week_month
+)
+from contest.models import GENERATION_BUILDING, Athlete, MonthPoint, Point, PointsGeneration, YearPoint
+
+
+def ranking(model, **period):
+    return [
+        (row.rank, row.athlete_id, row.total_points)
+        for row in model.query.filter_by(**period).order_by(model.rank)
+    ]
+
+
+@pytest.fixture
+def athletes(db_session):
+    db_session.add_all([Athlete(id=athlete_id, firstname=f"A{athlete_id}") for athlete_id in (1, 2, 3)])
+    db_session.commit()
+
+
+def test_week_month_matches_get_month_weeks():
+    for year in range(1995, 2045):
+        for month in range(1, 13):
+            for week in get_month_weeks(year, month):
+                assert week_month(year, week) == month
+        weeks_in_months = sum(len(get_month_weeks(year, month)) for month in range(1, 13))
+        assert weeks_in_months == sum(week_month(year, week) is not None for week in range(1, 54))
+    assert week_month(2025, 54) is None
+
+
+def test_leaderboards_follow_point_writes(db_session, athletes):
+    db_session.add_all([
+        Point(year=2025, week_number=1, athlete_id=1, total_points=10),
+        Point(year=2025, week_number=2, athlete_id=2, total_points=12),
+        Point(year=2025, week_number=6, athlete_id=3, total_points=4),
+    ])
+    db_session.commit()
+    assert ranking(MonthPoint, year=2025, month=1) == [(1, 2, 12), (2, 1, 10)]
+    assert ranking(MonthPoint, year=2025, month=2) == [(1, 3, 4)]
+    assert ranking(YearPoint, year=2025) == [(1, 2, 12), (2, 1, 10), (3, 3, 4)]
+
+    db_session.get(Point, (2025, 1, 1, 0)).total_points = 20
+    db_session.delete(db_session.get(Point, (2025, 6, 3, 0)))
+    db_session.commit()
+    assert ranking(MonthPoint, year=2025, month=1) == [(1, 1, 20), (2, 2, 12)]
+    assert ranking(MonthPoint, year=2025, month=2) == []
+    assert ranking(YearPoint, year=2025) == [(1, 1, 20), (2, 2, 12)]
+
+
+def test_leaderboards_ignore_rolled_back_points(db_session, athletes):
+    db_session.add(Point(year=2025, week_number=1, athlete_id=1, total_points=10))
+    db_session.flush()
+    db_session.rollback()
+    db_session.add(Point(year=2025, week_number=10, athlete_id=2, total_points=3))
+    db_session.commit()
+    assert ranking(MonthPoint, year=2025, month=1) == []
+    assert ranking(YearPoint, year=2025) == [(1, 2, 3)]
+
+
+def test_rebuild_leaderboards(db_session, athletes):
+    db_session.add_all([
+        Point(year=2024, week_number=52, athlete_id=1, total_points=5),
+        Point(year=2025, week_number=1, athlete_id=1, total_points=10),
+    ])
+    db_session.commit()
+    MonthPoint.query.delete()
+    YearPoint.query.delete()
+    db_session.commit()
+
+    rebuild_leaderboards()
+    db_session.commit()
+    assert ranking(MonthPoint, year=2024, month=12) == [(1, 1, 5)]
+    assert ranking(YearPoint, year=2024) == [(1, 1, 5)]
+    assert ranking(YearPoint, year=2025) == [(1, 1, 10)]
+
+
+def test_point_writes_bump_leaderboard_version(db_session, athletes):
+    assert leaderboard_version() == 0
+    db_session.add(Point(year=2025, week_number=1, athlete_id=1, total_points=10))
+    db_session.commit()
+    assert leaderboard_version() == 1
+    db_session.add(Athlete(id=4))
+    db_session.commit()
+    assert leaderboard_version() == 1
+
+
+def test_generation_being_built_is_left_out(db_session, athletes):
+    db_session.add(PointsGeneration(id=1, status=GENERATION_BUILDING, started_at=datetime(2025, 3, 1)))
+    db_session.commit()
+    db_session.add(Point(year=2025, week_number=1, athlete_id=1, generation=1, total_points=10))
+    db_session.commit()
+    assert leaderboard_version() == 0
+    assert not YearPoint.query.filter_by(generation=1).all()
+
+
+def test_leaderboard_cache_is_bounded():
+    cache = LeaderboardCache(maxsize=2)
+    cache.put((2025, 1, 1, 1), "a")
+    cache.put((2025, 1, 2, 1), "b")
+    assert cache.get((2025, 1, 1, 1)) == "a"
+    cache.put((2025, 1, 3, 1), "c")
+    # Least recently used entry evicted
+    assert cache.get((2025, 1, 2, 1)) is None
+    assert cache.get((2025, 1, 1, 1)) == "a"
+
+    # A newer version drops the stale entries, an older one is not cached
+    cache.put((2025, 1, 1, 2), "d")
+    assert cache.get((2025, 1, 1, 1)) is None
+    cache.put((2025, 1, 4, 1), "e")
+    assert cache.get((2025, 1, 4, 1)) is None
+    assert cache.get((2025, 1, 1, 2)) == "d"
@@ -0,0 +1,111 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+import pytest
+from sqlalchemy.exc import OperationalError
+from contest.extensions import db
+from contest.lease import DatabaseLease, run_exclusive
+from contest.models import Lease
+
+TTL = timedelta(seconds=60)
+
+
+@pytest.fixture()
+def file_app(file_app):
+    file_app.config["SCHEDULER_LEASE_TTL"] = 0.3
+    return file_app
+
+
+def record(runs, value, stop):
+    assert not stop.is_set()
+    runs.append(value)
+
+
+def test_lease_is_exclusive_until_released(app_fixture):
+    first = DatabaseLease(db.engine, "sync", TTL, holder="first")
+    second = DatabaseLease(db.engine, "sync", TTL, holder="second")
+    assert first.acquire()
+    assert first.acquire()  # renewal
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    assert not first.acquire()
+    assert db.session.get(Lease, "sync").holder == "second"
+
+
+def test_expired_lease_is_taken_over(app_fixture):
+    assert DatabaseLease(db.engine, "sync", -TTL, holder="crashed").acquire()
+    assert DatabaseLease(db.engine, "sync", TTL, holder="other").acquire()
+    assert DatabaseLease(db.engine, "compute", TTL, holder="crashed").acquire()
+
+
+def test_run_exclusive_skips_when_held(file_app):
+    with file_app.app_context():
+        assert DatabaseLease(db.engine, "sync", TTL, holder="other process").acquire()
+    runs = []
+    assert not run_exclusive(file_app, "sync", record, runs, 1)
+    assert run_exclusive(file_app, "compute", record, runs, 2)
+    assert runs == [2]
+
+
+def test_run_exclusive_runs_once_per_interval(file_app):
+    # The schedulers of two processes tick one after the other: only the first one runs
+    runs = []
+    assert run_exclusive(file_app, "sync", record, runs, 1, interval=timedelta(minutes=15))
+    assert not run_exclusive(file_app, "sync", record, runs, 2, interval=timedelta(minutes=15))
+    assert runs == [1]
+    with file_app.app_context():
+        lease = db.session.get(Lease, "sync")
+        lease.last_run_at -= timedelta(minutes=15)
+        db.session.commit()
+    assert run_exclusive(file_app, "sync", record, runs, 3, interval=timedelta(minutes=15))
+    assert runs == [1, 3]
+
+
+def test_run_exclusive_renews_the_lease(file_app):
+    # The run lasts several TTLs: the heartbeat keeps the other processes out
+    released = threading.Event()
+    taken_over, stopped = [], []
+
+    def long_run(stop):
+        with file_app.app_context():
+            other = DatabaseLease(db.engine, "sync", TTL, holder="other process")
+            for attempt in range(5):
+                taken_over.append(other.acquire())
+                released.wait(0.2 if attempt < 4 else 0)
+        stopped.append(stop.is_set())
+
+    assert run_exclusive(file_app, "sync", long_run)
+    assert taken_over == [False] * 5
+    assert stopped == [False]
+    with file_app.app_context():
+        assert DatabaseLease(db.engine, "sync", TTL, holder="other process").acquire()
+
+
+def test_run_exclusive_stops_when_the_lease_is_lost(file_app):
+    # Paused past the TTL, the lease was taken over: the run is asked to stop
+    def taken_over_run(stop):
+        with file_app.app_context():
+            Lease.query.filter_by(name="sync").update({"holder": "other process"})
+            db.session.commit()
+        assert stop.wait(5)
+
+    assert run_exclusive(file_app, "sync", taken_over_run)
+    with file_app.app_context():
+        # Still the other process's
+        assert not DatabaseLease(db.engine, "sync", TTL).acquire()
+
+
+def test_run_exclusive_stops_when_the_lease_cant_be_renewed(file_app):
+    # e.g. "database is locked" on every renewal: retried, then stopped before the lease expires
+    def locked_run(stop):
+        locked = OperationalError("UPDATE", {}, "database is locked")
+        with patch.object(DatabaseLease, "acquire", side_effect=locked) as acquire:
+            assert stop.wait(5)
+            attempts.append(acquire.call_count)
+
+    attempts = []
+    assert run_exclusive(file_app, "sync", locked_run)
+    # Every third of the TTL: after a second failure, less than a third of it would be left
+    assert 1 <= attempts[0] <= 2
@@ -0,0 +1,110 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import multiprocessing
+from unittest.mock import patch
+from benchmarks.dataset import generate_club, store_club
+from benchmarks.fake_strava import FakeStrava
+from benchmarks.suite import mocked_strava
+from contest.extensions import db
+from contest.metrics import MetricsRegistry, get_metrics, render
+from contest.models import Athlete
+from contest.strava_http import build_strava_session
+from contest.tasks import compute, store_week_points, strava_sync
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    return response.get_data(as_text=True).splitlines()
+
+
+def test_render_text_format():
+    registry = MetricsRegistry()
+    registry.inc("contest_strava_api_errors_total", code="429")
+    registry.inc("contest_strava_api_errors_total", 2, code="429")
+    for duration in (0.003, 0.2, 30):
+        registry.observe("contest_http_request_duration_seconds", duration, endpoint='api."x"', method="GET")
+    lines = render(registry.collect()).splitlines()
+    assert "# TYPE contest_strava_api_errors_total counter" in lines
+    assert 'contest_strava_api_errors_total{code="429"} 3.0' in lines
+    labels = 'endpoint="api.\\"x\\"",method="GET"'
+    assert f'contest_http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1' in lines
+    assert f'contest_http_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in lines
+    assert f'contest_http_request_duration_seconds_bucket{{{labels},le="10.0"}} 2' in lines
+    assert f'contest_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in lines
+    assert f"contest_http_request_duration_seconds_count{{{labels}}} 3" in lines
+    assert f"contest_http_request_duration_seconds_sum{{{labels}}} 30.203" in lines
+
+
+def _record_in_child(registry):
+    # Inherited registry: the parent's values must not be counted twice
+    registry.inc("contest_athlete_syncs_total", status="succeeded")
+    registry.set("contest_last_success_timestamp_seconds", 200, job="sync")
+    registry.flush()
+
+
+def test_processes_are_added_up(tmp_path):
+    registry = MetricsRegistry(str(tmp_path), flush_interval=60)
+    registry.inc("contest_athlete_syncs_total", 2, status="succeeded")
+    registry.set("contest_last_success_timestamp_seconds", 100, job="sync")
+    registry.set("contest_last_success_timestamp_seconds", 100, job="compute_incremental")
+    child = multiprocessing.get_context("fork").Process(target=_record_in_child, args=(registry,))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+    (tmp_path / "garbage.json").write_text("{", encoding="utf-8")
+
+    values = registry.collect()
+    assert values[("contest_athlete_syncs_total", (("status", "succeeded"),))] == 3
+    assert values[("contest_last_success_timestamp_seconds", (("job", "sync"),))] == 200
+    assert values[("contest_last_success_timestamp_seconds", (("job", "compute_incremental"),))] == 100
+    registry.flush()
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+
+def test_request_latency_by_endpoint(client):
+    client.get("/api/v1/leaderboard")
+    client.get("/metrics")
+    lines = scrape(client)
+    assert any(
+        line.startswith('contest_http_request_duration_seconds_count{endpoint="api.leaderboard",method="GET"')
+        and line.endswith(" 1") for line in lines
+    )
+    assert not any('endpoint="metrics.metrics_endpoint"' in line for line in lines)
+
+
+def test_sync_and_compute_metrics(app_fixture, client):
+    club = generate_club(athletes=1, years=0.1)
+    store_club(club, athletes=set())
+    with patch("contest.tasks.Client", side_effect=mocked_strava(club)):
+        strava_sync(app_fixture)
+    compute(app_fixture)
+    lines = scrape(client)
+    activities = len(club[0].activities())
+    assert 'contest_athlete_syncs_total{status="succeeded"} 1.0' in lines
+    assert "contest_athlete_sync_duration_seconds_count 1" in lines
+    assert f'contest_sync_activities_total{{result="inserted"}} {float(activities)}' in lines
+    assert 'contest_compute_duration_seconds_count{mode="incremental"} 1' in lines
+    assert any(line.startswith("contest_points_rows_written_total ") for line in lines)
+    assert any(line.startswith('contest_last_success_timestamp_seconds{job="sync"}') for line in lines)
+
+
+def test_points_rows_are_counted_once_committed(app_fixture, db_session):
+    db_session.add(Athlete(id=1, firstname="Test"))
+    db_session.commit()
+    store_week_points(1, 2025, 1, 3)
+    db.session.rollback()
+    store_week_points(1, 2025, 2, 3)
+    store_week_points(1, 2025, 3, 3)
+    db.session.commit()
+    assert get_metrics(app_fixture).collect() == {("contest_points_rows_written_total", ()): 2}
+
+
+def test_strava_api_calls_and_errors():
+    registry = MetricsRegistry()
+    with FakeStrava(activities=1, error_rate=0.5, seed=1) as strava:
+        session = build_strava_session(1, (5, 5), origin=strava.origin, metrics=registry)
+        statuses = [session.get("https://www.strava.com/api/v3/athlete").status_code for call in range(10)]
+    values = registry.collect()
+    assert values[("contest_strava_api_calls_total", ())] == 10
+    assert values[("contest_strava_api_errors_total", (("code", "500"),))] == statuses.count(500) > 0
@@ -0,0 +1,87 @@
+# pylint: disable=unused-argument,redefined-outer-name
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+import pytest
+from contest.models import Activity, Athlete, OnboardingJob, User
+from contest.onboarding import ONBOARDING_DONE, ONBOARDING_FAILED, ONBOARDING_RUNNING, start_onboarding
+
+
+@pytest.fixture(autouse=True)
+def strava_client(mock_stravalib_client, strava_activity):
+    mock_stravalib_client.return_value.access_token = "token"
+    mock_stravalib_client.return_value.get_activities.return_value = [strava_activity(1, datetime(2025, 3, 3, 8))]
+
+
+@pytest.fixture
+def user(db_session):
+    user = User(email="test@example.com")
+    user.set_password("test")
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def strava_oauth():
+    with patch("contest.strava.Client") as oauth_client:
+        oauth_client.return_value.exchange_code_for_token.return_value = {
+            "access_token": "token", "refresh_token": "refresh", "expires_at": 9999999999
+        }
+        oauth_client.return_value.get_athlete.return_value = MagicMock(
+            id=123, firstname="Test", lastname="User", country="Testland"
+        )
+        yield oauth_client
+
+
+def test_callback_onboards_athlete(client, user, strava_oauth, mock_stravalib_client, strava_activity):
+    monday = datetime(2025, 3, 3, 8)
+    mock_stravalib_client.return_value.get_activities.return_value = [
+        strava_activity(i, monday + timedelta(days=i)) for i in range(4)
+    ]
+    client.post("/login", data={"email": "test@example.com", "password": "test"})
+
+    response = client.get("/strava/callback?code=abc")
+    assert response.status_code == 200
+    assert Activity.query.filter_by(athlete_id=123).count() == 4
+
+    status = client.get("/api/v1/onboarding").get_json()
+    assert status["status"] == ONBOARDING_DONE
+    assert status["activities"] == 4
+    assert status["points"] == 6
+
+
+def test_onboarding_status_without_athlete(client, user):
+    client.post("/login", data={"email": "test@example.com", "password": "test"})
+    assert client.get("/api/v1/onboarding").status_code == 404
+
+
+def test_onboarding_is_idempotent(app_fixture, db_session, mock_stravalib_client):
+    db_session.add(Athlete(id=123, access_token="token"))
+    db_session.add(OnboardingJob(athlete_id=123, status=ONBOARDING_RUNNING, queued_at=datetime.now()))
+    db_session.commit()
+
+    # A job already running is not started again
+    start_onboarding(app_fixture, 123)
+    assert db_session.get(OnboardingJob, 123).status == ONBOARDING_RUNNING
+    mock_stravalib_client.return_value.get_activities.assert_not_called()
+
+    # Unless it was lost long ago
+    db_session.get(OnboardingJob, 123).queued_at = datetime.now() - timedelta(days=1)
+    db_session.commit()
+    start_onboarding(app_fixture, 123)
+    assert db_session.get(OnboardingJob, 123).status == ONBOARDING_DONE
+
+    # Linking again after a completed import runs it again (upserts: no duplicates)
+    start_onboarding(app_fixture, 123)
+    assert db_session.get(OnboardingJob, 123).status == ONBOARDING_DONE
+    assert Activity.query.count() == 1
+
+
+def test_onboarding_failure(app_fixture, db_session, mock_stravalib_client):
+    db_session.add(Athlete(id=123, access_token="token"))
+    db_session.commit()
+    mock_stravalib_client.return_value.get_activities.side_effect = RuntimeError("Strava is down")
+
+    job = start_onboarding(app_fixture, 123)
+    assert job.status == ONBOARDING_FAILED
+    assert job.error == "Strava is down"
@@ -0,0 +1,71 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import re
+from contextlib import contextmanager
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from contest.api import encode_cursor, get_activities_after, get_week_data
+from contest.extensions import db
+from contest.models import Activity, Athlete, Point
+from contest.rules import get_valid_activities, valid_activity_days, week_timestamps
+
+# "SCAN activity" (or "SCAN TABLE activity" before SQLite 3.36): a scan without any index
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?\w+$")
+
+
+@contextmanager
+def captured_selects():
+    """Collect the (statement, parameters) of the SELECT queries run in the block."""
+    queries = []
+
+    def listener(_conn, _cursor, statement, parameters, *_):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append((statement, parameters))
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        yield queries
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+
+def query_plans(queries):
+    connection = db.session.connection()
+    return [
+        [row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        for statement, parameters in queries
+    ]
+
+
+@pytest.fixture
+def sample_data(db_session):
+    db_session.add(Athlete(id=1, firstname="Test"))
+    db_session.add(Activity(id=1, athlete_id=1, start_date=datetime(2025, 3, 5, 8), moving_time=1800))
+    db_session.add(Point(year=2025, week_number=10, athlete_id=1, total_points=1))
+    db_session.commit()
+
+
+@pytest.mark.parametrize("hot_query", [
+    lambda: get_valid_activities(*week_timestamps(2025, 10), 1),
+    lambda: valid_activity_days(1),
+    valid_activity_days,
+    lambda: db.session.get(Athlete, 1).activities.order_by(
+        Activity.start_date.desc(), Activity.id.desc()
+    ).limit(10).all(),
+    lambda: get_activities_after(
+        db.session.get(Athlete, 1).activities.order_by(Activity.start_date.desc(), Activity.id.desc()),
+        encode_cursor(db.session.get(Activity, 1), None), 10, (),
+    ),
+    lambda: get_week_data(2025, 10),
+    lambda: Point.query.filter_by(athlete_id=1).all(),
+], ids=[
+    "valid_activities", "athlete_activity_days", "activity_days", "my_activities", "my_activities_cursor",
+    "week_leaderboard", "athlete_points",
+])
+def test_hot_queries_use_indexes(sample_data, hot_query):
+    db.session.expire_all()
+    with captured_selects() as queries:
+        hot_query()
+    assert queries
+    for plan in query_plans(queries):
+        assert not [step for step in plan if FULL_SCAN.match(step)], plan
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
@@ -0,0 +1,120 @@
+# pylint: disable=unused-argument,redefined-outer-name,protected-access
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from stravalib.exc import Fault
+from contest.models import Athlete
+from contest.ratelimit import RateBudget, get_rate_budget
+from contest.tasks import strava_sync
+
+
+def test_budget_tracks_response_headers():
+    budget = RateBudget(short_limit=100, long_limit=1000, reserve=10)
+    assert budget.remaining() == 90
+    budget({"X-RateLimit-Limit": "200,2000", "X-RateLimit-Usage": "50,1900"}, "POST")
+    assert budget.snapshot()["short_limit"] == 200
+    # The daily bucket is the tightest one: 2000 - 1900 - 10
+    assert budget.remaining() == 90
+    budget({
+        "X-ReadRateLimit-Limit": "100,1000", "X-ReadRateLimit-Usage": "95,100",
+        "X-RateLimit-Limit": "200,2000", "X-RateLimit-Usage": "95,100",
+    }, "GET")
+    assert budget.remaining() == 0
+
+
+def test_budget_try_acquire_and_refill():
+    budget = RateBudget(short_limit=10, long_limit=1000)
+    assert budget.try_acquire(6)
+    assert not budget.try_acquire(6)
+    assert budget.try_acquire(4)
+    # A new 15-minute window refills the short bucket only
+    budget._windows = (budget._windows[0], budget._windows[1], -1)
+    assert budget.remaining() == 10
+    assert budget.snapshot()["long_usage"] == 10
+
+
+def test_budget_exhaust():
+    budget = RateBudget(short_limit=100, long_limit=1000)
+    budget.exhaust()
+    assert budget.remaining() == 0
+
+
+def sync_over_budget(db_session, app_fixture):
+    """Sync three athletes with a budget of four calls left."""
+    now = datetime.now()
+    db_session.add_all([
+        # Inactive athlete, synchronized long ago
+        Athlete(id=1, access_token="t1", last_sync_at=now - timedelta(hours=1),
+                last_activity_at=now - timedelta(days=200), last_full_sync_at=now),
+        # Active athlete
+        Athlete(id=2, access_token="t2", last_sync_at=now - timedelta(minutes=15),
+                last_activity_at=now - timedelta(days=1), last_full_sync_at=now),
+        # Never synchronized
+        Athlete(id=3, access_token="t3"),
+    ])
+    db_session.commit()
+
+    budget = get_rate_budget(app_fixture)
+    budget.short_usage = budget.short_limit - budget.reserve - 4
+
+    def make_client(access_token=None, **_):
+        fake_client = MagicMock(access_token=access_token)
+        fake_client.get_athlete.return_value = MagicMock(
+            id=int(access_token[1:]), firstname="", lastname="", country=""
+        )
+        fake_client.get_activities.return_value = []
+        return fake_client
+
+    with patch("contest.tasks.Client", side_effect=make_client):
+        return strava_sync(app_fixture)
+
+
+def test_strava_sync_defers_athletes_over_budget(db_session, app_fixture):
+    summary = sync_over_budget(db_session, app_fixture)
+    # Two calls per athlete: the new and the active athletes fit, the inactive one waits
+    assert summary["succeeded"] == 2
+    assert summary["deferred"] == [1]
+    assert summary["failed"] == []
+
+
+def test_sync_status_requires_admin(client):
+    response = client.get("/api/v1/sync/status")
+    assert response.status_code == 403
+
+
+def test_sync_status(client, app_fixture):
+    client.post("/login", data={
+        "email": app_fixture.config["ADMIN_EMAIL"], "password": app_fixture.config["ADMIN_PASSWORD"]
+    })
+    response = client.get("/api/v1/sync/status")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["budget"]["remaining"] == 90
+    assert data["queue_depth"] == 0
+
+
+def test_sync_status_is_shared_by_the_processes(client, app_fixture, db_session):
+    summary = sync_over_budget(db_session, app_fixture)
+    # As seen from another worker process: its own budget is untouched
+    del app_fixture.extensions["strava_rate_budget"]
+    client.post("/login", data={
+        "email": app_fixture.config["ADMIN_EMAIL"], "password": app_fixture.config["ADMIN_PASSWORD"]
+    })
+    data = client.get("/api/v1/sync/status").get_json()
+    assert data["budget"]["remaining"] == 0
+    assert data["queue_depth"] == 1
+    assert data["last_sync"]["succeeded"] == summary["succeeded"]
+    assert data["last_sync"]["finished_at"]
+
+
+def test_strava_429_defers_the_athlete(db_session, app_fixture, mock_stravalib_client):
+    db_session.add(Athlete(id=1, access_token="t1"))
+    db_session.commit()
+    # stravalib raises a plain Fault for a 429, not RateLimitExceeded
+    mock_stravalib_client.return_value.get_athlete.side_effect = Fault(
+        "429 Client Error", response=SimpleNamespace(status_code=429)
+    )
+    summary = strava_sync(app_fixture)
+    assert summary["deferred"] == [1]
+    assert summary["failed"] == []
+    assert get_rate_budget(app_fixture).remaining() == 0
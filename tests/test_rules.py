@@ -1,8 +1,12 @@
 # pylint: disable=unused-argument,redefined-outer-name
 
+import random
 from datetime import datetime, timedelta
 import pytest
-from contest.rules import Standard, RegularityBonusA, RegularityBonusB, ContestEngine
+from sqlalchemy import event
+from contest.extensions import db
+from contest.models import Activity, Athlete
+from contest.rules import Standard, RegularityBonusA, RegularityBonusB, ContestEngine, SetContestEngine
 from contest import rules
 
 class DummyActivity:  # pylint: disable=too-few-public-methods
@@ -101,3 +105,111 @@ def test_contest_engine_sum(monkeypatch, activities_fixture):
     # All weeks should have the same points (6)
     for pts in points_by_week.values():
         assert pts == 6
+
+def test_week_timestamps_cover_whole_sunday():
+    start, end = rules.week_timestamps(2025, 2)
+    assert datetime.fromtimestamp(start) == datetime(2025, 1, 6)
+    assert datetime.fromtimestamp(end) == datetime(2025, 1, 12, 23, 59, 59)
+
+def test_previous_week():
+    assert rules.previous_week(2025, 10) == (2025, 9)
+    assert rules.previous_week(2025, 1) == (2024, 52)
+    assert rules.previous_week(2021, 1) == (2020, 53)
+
+def test_set_engine_matches_contest_engine(db_session, app_fixture):
+    rng = random.Random(42)
+    min_time = app_fixture.config["MINIMUM_ACTIVITY_TIME"]
+    athletes = [Athlete(id=athlete_id, firstname=f"A{athlete_id}") for athlete_id in range(1, 9)]
+    db_session.add_all(athletes)
+    activity_id = 0
+    for athlete in athletes:
+        day = datetime(2023, 12, 1)
+        while day < datetime(2025, 3, 1):
+            # Irregular cadence, several activities a day, some too short to count
+            for slot in range(rng.choice([0, 1, 1, 2])):
+                activity_id += 1
+                db_session.add(Activity(
+                    id=activity_id, athlete_id=athlete.id,
+                    start_date=day + timedelta(hours=rng.randint(0, 11) + 12 * slot, minutes=rng.randint(0, 59)),
+                    moving_time=rng.choice([min_time - 60, min_time, 2 * min_time]),
+                ))
+            day += timedelta(days=rng.choice([1, 1, 2, 3, 9]))
+    db_session.commit()
+
+    contest_rules = [
+        Standard(points_per_activity=1),
+        RegularityBonusA(bonus_points=2, week_number=1, year=2024),
+        RegularityBonusB(bonus_points=2),
+    ]
+    set_points = SetContestEngine(contest_rules).calculate_points()
+    assert set_points
+    for year in (2024, 2025):
+        for athlete in athletes:
+            expected = {
+                week: points
+                for week, points in ContestEngine(contest_rules, year).calculate_points_for_all_weeks(athlete).items()
+                if points
+            }
+            actual = {
+                (week_year, week): points
+                for (athlete_id, week_year, week), points in set_points.items()
+                if athlete_id == athlete.id and (
+                    week_year == year or (week_year, week) == rules.previous_week(year, 1)
+                )
+            }
+            assert actual == expected
+
+def test_rules_must_support_grouped_activities():
+    class CustomRule(rules.Rule):  # pylint: disable=too-few-public-methods,abstract-method
+        def calculate_points(self, athlete, activities):
+            return 1
+    with pytest.raises(TypeError, match="grouped_points"):
+        CustomRule()  # pylint: disable=abstract-class-instantiated
+
+def test_regularity_bonus_a_uses_weeks_with_activities(monkeypatch, activities_fixture):
+    def fail_get_valid_activities(_start, _end, _athlete_id):
+        raise AssertionError("previous week must not be queried")
+    monkeypatch.setattr(rules, "get_valid_activities", fail_get_valid_activities)
+    athlete = DummyAthlete(1)
+    rule = RegularityBonusA(bonus_points=2, week_number=1, year=2025, weeks_with_activities={(2024, 52)})
+    assert rule.calculate_points(athlete, activities_fixture) == 2
+    rule = RegularityBonusA(bonus_points=2, week_number=2, year=2025, weeks_with_activities={(2024, 52)})
+    assert rule.calculate_points(athlete, activities_fixture) == 0
+
+def test_contest_engine_no_query_per_week_for_previous_week(db_session, app_fixture):
+    athlete = Athlete(id=1, firstname="Test")
+    db_session.add(athlete)
+    db_session.add_all([
+        Activity(id=day, athlete_id=1, start_date=datetime(2024, 1, 1, 8) + timedelta(days=day), moving_time=3600)
+        for day in range(0, 364, 3)
+    ])
+    db_session.commit()
+    engine = ContestEngine([RegularityBonusA(bonus_points=2, week_number=1, year=2024)], 2024)
+    weeks = len(engine._weeks_to_compute(2024, 52))  # pylint: disable=protected-access
+    db_session.refresh(athlete)
+
+    statements = []
+    def listener(_conn, _cursor, statement, *_):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        points = engine.calculate_points_for_all_weeks(athlete)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    # One query per week for its activities, plus a single one for the weeks with activities
+    assert len(statements) == weeks + 1
+    assert points[(2024, 2)] == 2
+    assert points[(2024, 1)] == 0
+
+def test_active_weeks_among_given_weeks(db_session, app_fixture):
+    db_session.add(Athlete(id=1, firstname="Test"))
+    db_session.add_all([
+        Activity(id=1, athlete_id=1, start_date=datetime(2024, 12, 29, 23, 30), moving_time=3600),  # 2024-W52
+        Activity(id=2, athlete_id=1, start_date=datetime(2024, 12, 30, 0, 30), moving_time=3600),  # 2025-W01
+        Activity(id=3, athlete_id=1, start_date=datetime(2025, 3, 3, 8), moving_time=3600),  # 2025-W10
+        Activity(id=4, athlete_id=1, start_date=datetime(2025, 3, 10, 8), moving_time=60),  # too short
+    ])
+    db_session.commit()
+    assert rules.active_weeks(1) == {(2024, 52), (2025, 1), (2025, 10)}
+    assert rules.active_weeks(1, [(2025, 1), (2025, 11), (2025, 1)]) == {(2025, 1)}
+    assert rules.active_weeks(1, []) == set()
@@ -0,0 +1,76 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, text
+from contest.api import get_leaderboard_data
+from contest.extensions import READ_ENGINE, db, read_only
+from contest.models import Activity, Athlete, Point
+from contest.tasks import compute
+
+
+def test_connection_pragmas(file_app):
+    with file_app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert db.session.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        with read_only():
+            assert db.session.execute(text("PRAGMA query_only")).scalar() == 1
+        assert db.session.execute(text("PRAGMA query_only")).scalar() == 0
+
+
+def test_read_only_queries_use_the_read_engine(file_app):
+    engines = []
+
+    def listener(conn, *_):
+        engines.append(conn.engine)
+    read_engine = file_app.extensions[READ_ENGINE]
+    event.listen(read_engine, "before_cursor_execute", listener)
+    with file_app.app_context():
+        with read_only():
+            get_leaderboard_data(2025, 3, 10)
+        assert engines and set(engines) == {read_engine}
+        # Writes (flushes) always go to the writer
+        engines.clear()
+        with read_only():
+            db.session.add(Athlete(id=1, firstname="Test"))
+            db.session.flush()
+        db.session.commit()
+        assert db.session.get(Athlete, 1) is not None
+    event.remove(read_engine, "before_cursor_execute", listener)
+
+
+def test_leaderboard_reads_during_full_compute(file_app):
+    """Stress: leaderboard reads keep being served while a full compute writes."""
+    with file_app.app_context():
+        start = datetime(2025, 1, 6, 8)
+        for athlete_id in range(1, 31):
+            db.session.add(Athlete(id=athlete_id, firstname=f"A{athlete_id}"))
+            db.session.add_all(
+                Activity(id=athlete_id * 1000 + day, athlete_id=athlete_id, moving_time=1800,
+                         start_date=start + timedelta(days=day))
+                for day in range(0, 150, 2)
+            )
+        db.session.commit()
+
+    errors = []
+
+    def run_compute():
+        try:
+            compute(file_app, full=True)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            errors.append(e)
+    writer = threading.Thread(target=run_compute)
+    reads = 0
+    with file_app.app_context():
+        writer.start()
+        while writer.is_alive() or not reads:
+            with read_only():
+                get_leaderboard_data(2025, 3, 10)
+            db.session.rollback()
+            reads += 1
+        writer.join()
+        assert not errors
+        assert db.session.query(Point).count() > 0
+        with read_only():
+            assert get_leaderboard_data(2025, 3, 10)["week_points"]
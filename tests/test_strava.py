@@ -1,6 +1,12 @@
+import threading
+import time
+from datetime import datetime, timedelta, UTC
 from unittest.mock import patch, MagicMock
-from contest.models import Athlete, User
-from contest.tasks import strava_sync
+import pytest
+from sqlalchemy import event
+from contest.extensions import db
+from contest.models import Activity, Athlete, User
+from contest.tasks import prefetch_pages, strava_sync, sync_athlete, sync_interval, upsert_activities
 
 def test_strava_sync_runs_without_real_api(db_session, app_fixture):
     # Create a fake athlete in the database
@@ -70,3 +76,272 @@ def test_strava_callback_links_athlete(client, db_session):
         assert athlete.firstname == "Test"
         user = db_session.get(User, user.id)
         assert user.athlete_id == 123
+
+def test_strava_sync_concurrent_isolates_failures(file_app):
+    app = file_app
+    with app.app_context():
+        for athlete_id in range(1, 7):
+            db.session.add(Athlete(id=athlete_id, firstname=f"A{athlete_id}", access_token=f"token{athlete_id}"))
+        db.session.commit()
+
+    def make_client(access_token=None, **_):
+        athlete_id = int(access_token.removeprefix("token"))
+        fake_client = MagicMock()
+        fake_client.access_token = access_token
+        if athlete_id == 3:
+            fake_client.get_athlete.side_effect = RuntimeError("Strava is down")
+        fake_client.get_athlete.return_value = MagicMock(
+            id=athlete_id, firstname=f"A{athlete_id}", lastname="", country=""
+        )
+        fake_client.get_activities.return_value = []
+        return fake_client
+
+    with patch("contest.tasks.Client", side_effect=make_client):
+        summary = strava_sync(app, workers=3)
+
+    assert summary["athletes"] == 6
+    assert summary["succeeded"] == 5
+    assert summary["failed"] == [3]
+    assert summary["throughput"] > 0
+    assert summary["latency"]["max"] >= summary["latency"]["min"]
+
+def test_sync_athlete_batches_activity_upserts(db_session, strava_activity):
+    athlete = Athlete(id=123, firstname="Test", access_token="token")
+    db_session.add(athlete)
+    db_session.commit()
+
+    start = datetime(2025, 1, 1, 7, 0)
+    activities = [strava_activity(i, start + timedelta(hours=i)) for i in range(1, 501)]
+    fake_client = MagicMock()
+    fake_client.access_token = "token"
+    fake_client.get_athlete.return_value = MagicMock(id=123, firstname="Test", lastname="User", country="")
+    fake_client.get_activities.side_effect = lambda **_: iter(activities)
+
+    with patch("contest.tasks.Client", return_value=fake_client):
+        first = sync_athlete(athlete)
+        assert first == {"fetched": 500, "inserted": 500, "updated": 0}
+        assert Activity.query.count() == 500
+
+        statements = []
+
+        def listener(_conn, _cursor, statement, *_):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            second = sync_athlete(athlete)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        assert second == {"fetched": 500, "inserted": 0, "updated": 0}
+        assert len(statements) < 10
+
+        activities[0] = strava_activity(1, start + timedelta(hours=1), name="Renamed")
+        assert sync_athlete(athlete) == {"fetched": 500, "inserted": 0, "updated": 1}
+        assert db_session.get(Activity, 1).name == "Renamed"
+
+def test_concurrent_upserts_of_a_new_activity(file_app, strava_activity):
+    # e.g. a push event applied while the scheduled sync fetches the same activity
+    app = file_app
+    with app.app_context():
+        db.session.add(Athlete(id=1, firstname="Test"))
+        db.session.commit()
+    activity = strava_activity(1, datetime(2025, 1, 1, 7))
+    # Lets both workers look up the known activities at the same time, if they can
+    barrier = threading.Barrier(2)
+
+    def listener(_conn, _cursor, statement, *_):
+        if statement.startswith("SELECT activity.id"):
+            try:
+                barrier.wait(0.5)
+            except threading.BrokenBarrierError:
+                pass
+
+    results = []
+
+    def upsert():
+        with app.app_context():
+            results.append(upsert_activities(1, [activity]))
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", listener)
+    workers = [threading.Thread(target=upsert) for worker in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(results) == [(0, 0), (1, 0)]
+    with app.app_context():
+        assert Activity.query.count() == 1
+
+def test_sync_athlete_incremental_watermark(db_session, app_fixture, strava_activity):
+    athlete = Athlete(id=123, firstname="Test", access_token="token")
+    db_session.add(athlete)
+    db_session.commit()
+
+    latest = datetime.now() - timedelta(days=2)
+    fake_client = MagicMock()
+    fake_client.access_token = "token"
+    fake_client.get_athlete.return_value = MagicMock(id=123, firstname="Test", lastname="User", country="")
+    fake_client.get_activities.return_value = [
+        strava_activity(1, latest - timedelta(days=10)), strava_activity(2, latest)
+    ]
+
+    with patch("contest.tasks.Client", return_value=fake_client):
+        # First sync covers the whole window and sets the watermark
+        sync_athlete(athlete)
+        assert athlete.last_activity_at == latest
+        assert athlete.last_full_sync_at is not None
+        first_after = fake_client.get_activities.call_args.kwargs["after"]
+        assert first_after < latest - timedelta(days=300)
+
+        # Next cycles only fetch after the watermark, with an overlap
+        fake_client.get_activities.return_value = []
+        sync_athlete(athlete)
+        overlap = timedelta(hours=app_fixture.config["STRAVA_SYNC_OVERLAP"])
+        assert fake_client.get_activities.call_args.kwargs["after"] == latest - overlap
+        assert athlete.last_activity_at == latest
+
+        # A stale full sync triggers a deep resync of the whole window
+        athlete.last_full_sync_at = datetime.now() - timedelta(days=30)
+        db_session.commit()
+        sync_athlete(athlete)
+        assert fake_client.get_activities.call_args.kwargs["after"] < latest - timedelta(days=300)
+        assert athlete.last_full_sync_at > datetime.now() - timedelta(days=1)
+
+        # A deep resync can also be forced
+        sync_athlete(athlete, full=True)
+        assert fake_client.get_activities.call_args.kwargs["after"] < latest - timedelta(days=300)
+
+
+def _slow_items(count, delay, fetched):
+    for item in range(count):
+        time.sleep(delay)
+        fetched.append(item)
+        yield item
+
+
+def test_prefetch_pages_overlaps_fetch_and_write():
+    fetched = []
+    pages = prefetch_pages(_slow_items(10, 0, fetched), batch_size=2, depth=2)
+    assert next(pages) == [0, 1]
+    # While the first page is being written, the next ones are fetched
+    deadline = time.monotonic() + 5
+    while len(fetched) < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(fetched) >= 6
+    assert list(pages) == [[2, 3], [4, 5], [6, 7], [8, 9]]
+
+
+class ResettingResults:
+    """Paged results which, once exhausted, start over like stravalib's BatchedResultsIterator."""
+    def __init__(self, count):
+        self.count = count
+        self.position = 0
+        self.calls = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.calls += 1
+        if self.calls > 100:
+            raise AssertionError("Iterated past the end")
+        if self.position == self.count:
+            self.position = 0
+            raise StopIteration
+        self.position += 1
+        return self.position - 1
+
+
+@pytest.mark.parametrize("count", [0, 3, 4])
+def test_prefetch_pages_stops_at_the_end_of_resetting_results(count):
+    pages = list(prefetch_pages(ResettingResults(count), batch_size=2, depth=2))
+    assert [item for page in pages for item in page] == list(range(count))
+
+
+def test_prefetch_pages_backpressure_and_cancellation():
+    fetched = []
+    pages = prefetch_pages(_slow_items(100, 0, fetched), batch_size=2, depth=2)
+    assert next(pages) == [0, 1]
+    time.sleep(0.1)
+    # The fetcher is blocked on the full queue (2 pages + the one it holds)
+    assert len(fetched) <= 8
+    pages.close()
+    assert len(fetched) <= 8
+
+
+def test_prefetch_pages_raises_fetch_errors():
+    def failing_items():
+        yield 1
+        raise RuntimeError("Strava is down")
+
+    with pytest.raises(RuntimeError, match="Strava is down"):
+        list(prefetch_pages(failing_items(), batch_size=1, depth=2))
+
+
+def test_sync_interval():
+    now = datetime(2025, 6, 1)
+    minimum, maximum = timedelta(minutes=15), timedelta(hours=24)
+    # Active athlete: polled as often as allowed
+    assert sync_interval(Athlete(last_activity_at=now - timedelta(days=2)), now, 20) == minimum
+    # Regular but occasional uploader (every 10 days): still within twice their usual gap
+    assert sync_interval(Athlete(last_activity_at=now - timedelta(days=18)), now, 3) == minimum
+    # Inactive athletes back off with their inactivity, up to the maximum
+    assert minimum < sync_interval(Athlete(last_activity_at=now - timedelta(days=20)), now, 0) < maximum
+    assert sync_interval(Athlete(last_activity_at=now - timedelta(days=200)), now, 0) == maximum
+    assert sync_interval(Athlete(), now, 0) == maximum
+    # A recent change counts as activity
+    athlete = Athlete(last_activity_at=now - timedelta(days=200), last_change_at=now - timedelta(days=1))
+    assert sync_interval(athlete, now, 0) == minimum
+
+
+def test_strava_sync_only_syncs_due_athletes(db_session, app_fixture, mock_stravalib_client):
+    mock_stravalib_client.return_value.get_activities.return_value = []
+    mock_stravalib_client.return_value.access_token = "t"
+    now = datetime.now(UTC).replace(tzinfo=None)
+    db_session.add_all([
+        Athlete(id=1, access_token="t", next_sync_at=now - timedelta(minutes=1)),
+        Athlete(id=2, access_token="t", next_sync_at=now + timedelta(hours=5)),
+        Athlete(id=3, access_token="t"),
+    ])
+    db_session.commit()
+
+    summary = strava_sync(app_fixture)
+    assert summary["athletes"] == 2
+    # Never had any activity: next sync at the maximum interval, after the start of the tick
+    athlete = db_session.get(Athlete, 3)
+    assert timedelta(hours=23, minutes=59) < athlete.next_sync_at - athlete.last_sync_at <= timedelta(hours=24)
+
+
+def test_active_athletes_are_synced_on_every_tick(db_session, app_fixture, mock_stravalib_client):
+    # Polled at the tick period (15 min), by ticks a few milliseconds late: the clock moves
+    # on between the start of the tick and the sync of each athlete
+    mock_stravalib_client.return_value.get_activities.return_value = []
+    mock_stravalib_client.return_value.access_token = "t"
+    app_fixture.config.update(STRAVA_SYNC_INTERVAL=15, STRAVA_SYNC_MIN_INTERVAL=15)
+    start = datetime(2025, 6, 1, 12)
+    db_session.add_all([
+        Athlete(id=athlete_id, access_token="t", last_activity_at=start - timedelta(days=1))
+        for athlete_id in (1, 2, 3)
+    ])
+    db_session.commit()
+    clock = {"now": start}
+
+    def utcnow():
+        clock["now"] += timedelta(milliseconds=3)
+        return clock["now"]
+
+    with patch("contest.tasks.utcnow", utcnow):
+        assert strava_sync(app_fixture)["succeeded"] == 3
+        clock["now"] = start + timedelta(minutes=15, milliseconds=5)
+        assert strava_sync(app_fixture)["succeeded"] == 3
+
+
+def test_stopped_strava_sync_defers_the_athletes(db_session, app_fixture, mock_stravalib_client):
+    db_session.add_all([Athlete(id=1, access_token="t"), Athlete(id=2, access_token="t")])
+    db_session.commit()
+    stop = threading.Event()
+    stop.set()
+    summary = strava_sync(app_fixture, stop=stop)
+    assert summary["deferred"] == [1, 2]
+    assert not mock_stravalib_client.called
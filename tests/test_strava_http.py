@@ -0,0 +1,33 @@
+# pylint: disable=unused-argument,redefined-outer-name
+from unittest.mock import patch
+import requests
+from benchmarks.fake_strava import FakeStrava
+from contest.models import Athlete
+from contest.strava_http import build_strava_session, get_strava_session
+from contest.tasks import strava_client
+
+
+def test_session_reuses_connections():
+    with FakeStrava(activities=3) as strava:
+        session = build_strava_session(2, (5, 30), origin=strava.origin)
+        for page in (1, 1):
+            response = session.get("https://www.strava.com/api/v3/athlete/activities", params={"page": page})
+            assert [activity["id"] for activity in response.json()] == [3, 2, 1]
+        assert strava.stats == {"connections": 1, "requests": 2}
+
+
+def test_adapter_default_timeout_and_origin():
+    adapter = build_strava_session(2, (1, 2), origin="http://127.0.0.1:8081").get_adapter("https://www.strava.com")
+    request = requests.Request("GET", "https://www.strava.com/api/v3/athlete?page=2").prepare()
+    with patch("requests.adapters.HTTPAdapter.send") as send:
+        adapter.send(request)
+        adapter.send(request, timeout=10)
+    assert [call.kwargs["timeout"] for call in send.call_args_list] == [(1, 2), 10]
+    assert request.url == "http://127.0.0.1:8081/api/v3/athlete?page=2"
+
+
+def test_clients_share_the_app_session(app_fixture, mock_stravalib_client):
+    for athlete_id in (1, 2):
+        strava_client(Athlete(id=athlete_id, access_token=f"t{athlete_id}"))
+    sessions = {call.kwargs["requests_session"] for call in mock_stravalib_client.call_args_list}
+    assert sessions == {get_strava_session(app_fixture)}
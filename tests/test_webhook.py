@@ -0,0 +1,126 @@
+# pylint: disable=unused-argument,redefined-outer-name
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from stravalib.exc import AccessUnauthorized
+from contest.models import Activity, Athlete, Point
+
+
+def send_event(client, **fields):
+    """Fake Strava event sender: post a push event the way Strava does."""
+    event = {
+        "object_type": "activity",
+        "object_id": 1,
+        "aspect_type": "create",
+        "owner_id": 123,
+        "subscription_id": 1,
+        "event_time": int(time.time()),
+        "updates": {},
+    }
+    event.update(fields)
+    return client.post("/strava/webhook", json=event)
+
+
+@pytest.fixture
+def athlete(db_session):
+    athlete = Athlete(id=123, firstname="Test", lastname="User", access_token="token", refresh_token="refresh")
+    db_session.add(athlete)
+    db_session.commit()
+    return athlete
+
+
+@pytest.fixture
+def pushed_activity(mock_stravalib_client, strava_activity):
+    activity = strava_activity(42, datetime(2025, 3, 5, 12, 0), name="Lunch Run")
+    instance = mock_stravalib_client.return_value
+    instance.access_token = "token"
+    instance.get_activity.return_value = activity
+    return activity
+
+
+def test_subscription_handshake(client, app_fixture):
+    response = client.get("/strava/webhook", query_string={
+        "hub.mode": "subscribe",
+        "hub.verify_token": app_fixture.config["STRAVA_WEBHOOK_VERIFY_TOKEN"],
+        "hub.challenge": "15f7d1a91c1f40f8a748fd134752feb3",
+    })
+    assert response.status_code == 200
+    assert response.get_json() == {"hub.challenge": "15f7d1a91c1f40f8a748fd134752feb3"}
+
+
+def test_subscription_handshake_bad_token(client):
+    response = client.get("/strava/webhook", query_string={
+        "hub.mode": "subscribe", "hub.verify_token": "wrong", "hub.challenge": "abc",
+    })
+    assert response.status_code == 403
+
+
+def test_invalid_event(client):
+    response = client.post("/strava/webhook", json={"object_type": "activity"})
+    assert response.status_code == 400
+
+
+def test_activity_create_fetches_activity_and_computes_points(client, athlete, pushed_activity,
+                                                               mock_stravalib_client, db_session):
+    response = send_event(client, object_id=42)
+    assert response.status_code == 200
+    mock_stravalib_client.return_value.get_activity.assert_called_once_with(42)
+    mock_stravalib_client.return_value.get_activities.assert_not_called()
+    assert db_session.get(Activity, 42).name == "Lunch Run"
+    point = Point.query.filter_by(athlete_id=123).one()
+    assert (point.year, point.week_number) == (2025, 10)
+
+
+def test_activity_update_refreshes_activity(client, athlete, pushed_activity, db_session):
+    send_event(client, object_id=42)
+    pushed_activity.name = "Renamed"
+    send_event(client, object_id=42, aspect_type="update", updates={"title": "Renamed"})
+    assert db_session.get(Activity, 42).name == "Renamed"
+
+
+def test_activity_delete_removes_activity_and_points(client, athlete, pushed_activity, db_session):
+    send_event(client, object_id=42)
+    send_event(client, object_id=42, aspect_type="delete")
+    assert db_session.get(Activity, 42) is None
+    assert Point.query.filter_by(athlete_id=123).count() == 0
+
+
+def test_athlete_deauthorization(client, athlete, pushed_activity, mock_stravalib_client, db_session):
+    send_event(client, object_id=42)
+    # Confirmed by Strava: the token is refused
+    mock_stravalib_client.return_value.get_athlete.side_effect = AccessUnauthorized(
+        "Unauthorized", response=SimpleNamespace(status_code=401)
+    )
+    send_event(client, object_type="athlete", object_id=123, aspect_type="update",
+               updates={"authorized": "false"})
+    athlete = db_session.get(Athlete, 123)
+    assert athlete.access_token is None
+    assert Activity.query.filter_by(athlete_id=123).count() == 0
+    assert Point.query.filter_by(athlete_id=123).count() == 0
+
+
+def test_event_for_unknown_athlete_is_ignored(client, pushed_activity, mock_stravalib_client):
+    response = send_event(client, owner_id=999)
+    assert response.status_code == 200
+    mock_stravalib_client.return_value.get_activity.assert_not_called()
+
+
+def test_forged_deauthorization_is_ignored(client, athlete, pushed_activity, db_session):
+    send_event(client, object_id=42)
+    # Strava still accepts the athlete's token (conftest mock)
+    response = send_event(client, object_type="athlete", object_id=7, aspect_type="update", owner_id=123,
+                          updates={"authorized": "false"})
+    assert response.status_code == 200
+    assert db_session.get(Athlete, 123).access_token == "token"
+    assert Activity.query.filter_by(athlete_id=123).count() == 1
+    assert Point.query.filter_by(athlete_id=123).count() == 1
+
+
+def test_events_of_other_subscriptions_are_refused(client, app_fixture, athlete, pushed_activity,
+                                                   mock_stravalib_client):
+    assert send_event(client, subscription_id=2).status_code == 403
+    assert send_event(client, subscription_id=None).status_code == 403
+    app_fixture.config["STRAVA_WEBHOOK_SUBSCRIPTION_ID"] = None
+    assert send_event(client).status_code == 403
+    mock_stravalib_client.return_value.get_activity.assert_not_called()